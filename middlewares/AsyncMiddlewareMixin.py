@@ -0,0 +1,125 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+
+class AsyncMiddlewareMixin:
+    """
+    Base class of the middlewares, serving WSGI and ASGI chains natively.
+
+    As with Django's ``MiddlewareMixin``, subclasses implement ``process_request``
+    and ``process_response``. Here they also run inline in async mode, where Django's
+    mixin runs them through ``sync_to_async`` and so pays a thread hop per hook. The
+    hooks must therefore not block. A middleware whose async path has to await
+    something, or that wraps the call to the next middleware, overrides ``handle``
+    and ``ahandle`` instead. ``process_view``, ``process_exception`` and
+    ``process_template_response`` are called by Django's handler itself when a
+    subclass defines them, as with ``MiddlewareMixin``; an exception raised by the
+    view never propagates to ``handle``, it reaches ``process_exception``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        """
+        Initialize the middleware with the given get_response callable.
+
+        Parameters
+        ----------
+        get_response : callable
+            The next middleware or view in the chain.
+        """
+        self.get_response = get_response
+        # Run natively in async mode when the next middleware or view is async
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        """
+        Handle the incoming request with ``handle``, or ``ahandle`` in async mode.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        HttpResponse or coroutine
+            The HTTP response, or in async mode a coroutine returning it.
+        """
+        if self.async_mode:
+            return self.ahandle(request)
+        return self.handle(request)
+
+    def handle(self, request):
+        """
+        Run ``process_request``, the next middleware or view, then ``process_response``.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        HttpResponse
+            The HTTP response.
+        """
+        response = self.process_request(request)
+        if response is None:
+            response = self.get_response(request)
+        return self.process_response(request, response)
+
+    async def ahandle(self, request):
+        """
+        Async counterpart of ``handle``, used when the middleware chain runs under ASGI.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        HttpResponse
+            The HTTP response.
+        """
+        response = self.process_request(request)
+        if response is None:
+            response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_request(self, request):
+        """
+        Inspect the request before it is passed on.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        HttpResponse or None
+            A response to return without calling the next middleware or view, or None.
+        """
+        return None
+
+    def process_response(self, request, response):
+        """
+        Inspect or replace the response on its way back.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+        response : HttpResponse
+            The HTTP response from the next middleware or view.
+
+        Returns
+        -------
+        HttpResponse
+            The response to return.
+        """
+        return response
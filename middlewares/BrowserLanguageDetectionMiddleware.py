@@ -1,44 +1,49 @@
 from django.utils import translation
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-class BrowserLanguageDetectionMiddleware:
+class BrowserLanguageDetectionMiddleware(AsyncMiddlewareMixin):
     """
     Middleware to detect and switch the language based on the browser's Accept-Language header.
     
     This middleware reads the 'HTTP_ACCEPT_LANGUAGE' header from the request and activates
     the first language specified in the header.
     """
-    
-    def __init__(self, get_response):
+
+    def process_request(self, request):
         """
-        Initialize the middleware with the given get_response callable.
+        Switch the language based on the browser's Accept-Language header.
         
         Parameters
         ----------
-        get_response : callable
-            The next middleware or view in the chain.
+        request : HttpRequest
+            The incoming HTTP request.
+        
+        Returns
+        -------
+        None
+            The request is always passed on to the next middleware or view.
         """
-        self.get_response = get_response
+        # Get the language code from the 'HTTP_ACCEPT_LANGUAGE' header
+        lang = request.META.get('HTTP_ACCEPT_LANGUAGE', 'en').split(',')[0]
+        # Activate the detected language
+        translation.activate(lang)
+        return None
 
-    def __call__(self, request):
+    def process_response(self, request, response):
         """
-        Handle the incoming request and switch the language based on the browser's Accept-Language header.
+        Deactivate the language after the response is generated.
         
         Parameters
         ----------
         request : HttpRequest
             The incoming HTTP request.
+        response : HttpResponse
+            The HTTP response from the next middleware or view.
         
         Returns
         -------
         HttpResponse
             The HTTP response from the next middleware or view.
         """
-        # Get the language code from the 'HTTP_ACCEPT_LANGUAGE' header
-        lang = request.META.get('HTTP_ACCEPT_LANGUAGE', 'en').split(',')[0]
-        # Activate the detected language
-        translation.activate(lang)
-        # Get the response from the next middleware or view
-        response = self.get_response(request)
-        # Deactivate the language after the response is generated
         translation.deactivate()
         return response
\ No newline at end of file
@@ -1,50 +1,241 @@
+import re
+import threading
+from django.conf import settings
 from django.http import HttpResponse
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-class CORSPrefightMiddleware:
+DEFAULT_METHODS = ('GET', 'POST', 'OPTIONS')
+DEFAULT_HEADERS = ('Content-Type', 'Authorization')
+
+
+def compile_origin_pattern(pattern):
+    """
+    Turn a wildcard origin such as 'https://*.example.com' into a regular expression.
+
+    The '*' matches one or more host labels, so 'https://*.example.com' allows
+    'https://app.example.com' and 'https://a.b.example.com' but not 'https://example.com'.
+
+    Parameters
+    ----------
+    pattern : str
+        The origin pattern, in lower case.
+
+    Returns
+    -------
+    str
+        The regular expression source, without anchors.
+    """
+    return re.escape(pattern).replace(r'\*', r'[a-z0-9-]+(?:\.[a-z0-9-]+)*')
+
+
+class OriginRule:
+    """
+    Preflight answer for one entry of ``CORS_ALLOWED_ORIGINS``, built once at startup.
+    """
+
+    __slots__ = ('methods', 'headers')
+
+    def __init__(self, methods, allowed_headers, max_age, allow_credentials):
+        """
+        Build the immutable headers shared by every origin the entry allows.
+
+        Parameters
+        ----------
+        methods : iterable of str
+            The methods the origin may use.
+        allowed_headers : iterable of str
+            The request headers the origin may send.
+        max_age : int
+            Seconds browsers may cache the preflight result.
+        allow_credentials : bool
+            Whether cookies and authorization headers may be sent.
+        """
+        self.methods = frozenset(method.upper() for method in methods)
+        headers = [
+            ('Access-Control-Allow-Methods', ', '.join(sorted(self.methods))),
+            ('Access-Control-Allow-Headers', ', '.join(allowed_headers)),
+            ('Access-Control-Max-Age', str(max_age)),
+        ]
+        if allow_credentials:
+            headers.append(('Access-Control-Allow-Credentials', 'true'))
+        self.headers = tuple(headers)
+
+
+class CORSPrefightMiddleware(AsyncMiddlewareMixin):
     """
     Middleware to handle CORS preflight requests.
-    
-    This middleware intercepts HTTP OPTIONS requests and adds the necessary
-    CORS headers to the response. This is useful for enabling cross-origin
-    requests in a Django application.
+
+    This middleware answers CORS preflight requests (OPTIONS requests with an
+    ``Access-Control-Request-Method`` header) without calling the view. The origin
+    is checked against the allowlist, compiled at startup into a set of exact
+    origins and one combined regular expression for the wildcard patterns, and the
+    response carries an ``Access-Control-Max-Age`` so browsers cache the result
+    instead of repeating the preflight before every request.
+
+    Settings
+    --------
+    CORS_ALLOWED_ORIGINS : iterable of str or dict
+        Allowed origins such as 'https://app.example.com' or 'https://*.example.com',
+        or a dict mapping each of them to the methods it may use. '*' allows any
+        origin (default).
+    CORS_ALLOWED_METHODS : iterable of str
+        Methods allowed for origins without their own list (default GET, POST, OPTIONS).
+    CORS_ALLOWED_HEADERS : iterable of str
+        Request headers allowed (default Content-Type, Authorization).
+    CORS_PREFLIGHT_MAX_AGE : int
+        Seconds browsers may cache a preflight result (default 86400).
+    CORS_ALLOW_CREDENTIALS : bool
+        Whether credentials may be sent; ignored for the '*' origin (default False).
     """
-    
+
+    # Number of origins matched by wildcard whose header sets are remembered
+    MAX_CACHED_ORIGINS = 1024
+
     def __init__(self, get_response):
         """
-        Initialize the middleware with the given get_response callable.
-        
+        Initialize the middleware with the given get_response callable and compile the allowlist.
+
         Parameters
         ----------
         get_response : callable
             The next middleware or view in the chain.
         """
-        self.get_response = get_response
+        super().__init__(get_response)
+        origins = getattr(settings, 'CORS_ALLOWED_ORIGINS', None) or ('*',)
+        if not isinstance(origins, dict):
+            origins = dict.fromkeys(origins)
+        default_methods = getattr(settings, 'CORS_ALLOWED_METHODS', DEFAULT_METHODS)
+        allowed_headers = tuple(getattr(settings, 'CORS_ALLOWED_HEADERS', DEFAULT_HEADERS))
+        max_age = getattr(settings, 'CORS_PREFLIGHT_MAX_AGE', 86400)
+        allow_credentials = getattr(settings, 'CORS_ALLOW_CREDENTIALS', False)
 
-    def __call__(self, request):
+        self.any_origin = None
+        self.exact_origins = {}
+        wildcard_rules = []
+        for pattern, methods in origins.items():
+            pattern = pattern.lower().rstrip('/')
+            if pattern == '*':
+                # Browsers refuse credentials with a '*' origin
+                self.any_origin = OriginRule(methods or default_methods, allowed_headers, max_age, False)
+            else:
+                rule = OriginRule(methods or default_methods, allowed_headers, max_age, allow_credentials)
+                if '*' in pattern:
+                    wildcard_rules.append((pattern, rule))
+                else:
+                    self.exact_origins[pattern] = rule
+        self.any_origin_entry = None
+        if self.any_origin is not None:
+            self.any_origin_entry = (
+                self.any_origin.methods,
+                (('Access-Control-Allow-Origin', '*'),) + self.any_origin.headers,
+            )
+        # One alternation with a named group per pattern tells which rule matched
+        self.wildcard_rules = [rule for _, rule in wildcard_rules]
+        self.wildcard_pattern = None
+        if wildcard_rules:
+            self.wildcard_pattern = re.compile('|'.join(
+                f'(?P<p{index}>{compile_origin_pattern(pattern)})'
+                for index, (pattern, _) in enumerate(wildcard_rules)
+            ))
+        # Full header sets per allowed origin, built on first use
+        self.origin_headers = {}
+        self.origin_headers_lock = threading.Lock()
+
+    def match_origin(self, origin):
         """
-        Handle the incoming request. If the request method is OPTIONS, return
-        a response with the appropriate CORS headers. Otherwise, pass the 
-        request to the next middleware or view.
-        
+        Find the allowlist entry that admits an origin.
+
+        Parameters
+        ----------
+        origin : str
+            The Origin header of the request, in lower case.
+
+        Returns
+        -------
+        OriginRule or None
+            The matching entry, or None if the origin is not allowed.
+        """
+        rule = self.exact_origins.get(origin)
+        if rule is not None:
+            return rule
+        if self.wildcard_pattern is not None:
+            match = self.wildcard_pattern.fullmatch(origin)
+            if match is not None:
+                return self.wildcard_rules[int(match.lastgroup[1:])]
+        return self.any_origin
+
+    def get_origin_headers(self, origin):
+        """
+        Get the preflight headers for an origin, building them on first use.
+
+        Parameters
+        ----------
+        origin : str
+            The Origin header of the request.
+
+        Returns
+        -------
+        tuple or None
+            The allowed methods and the (name, value) header pairs of the response,
+            or None if the origin is not allowed.
+        """
+        entry = self.origin_headers.get(origin)
+        if entry is not None:
+            return entry
+        rule = self.match_origin(origin.lower())
+        if rule is None:
+            return None
+        if rule is self.any_origin:
+            # The same headers answer every origin, so there is nothing to remember
+            return self.any_origin_entry
+        entry = (rule.methods, (('Access-Control-Allow-Origin', origin),) + rule.headers)
+        with self.origin_headers_lock:
+            # Wildcards admit unbounded origins, so start over rather than grow forever
+            if len(self.origin_headers) >= self.MAX_CACHED_ORIGINS:
+                self.origin_headers.clear()
+            self.origin_headers[origin] = entry
+        return entry
+
+    def preflight(self, request):
+        """
+        Answer a preflight request.
+
         Parameters
         ----------
         request : HttpRequest
-            The incoming HTTP request.
-        
+            The incoming OPTIONS request.
+
         Returns
         -------
         HttpResponse
-            The HTTP response with CORS headers if the method is OPTIONS,
-            otherwise the response from the next middleware or view.
-        """
-        if request.method == 'OPTIONS':
-            # Create an empty HTTP response
-            response = HttpResponse()
-            # Add CORS headers to the response
-            response['Access-Control-Allow-Origin'] = '*'
-            response['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-            response['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
-            return response
-        
+            The preflight response, without CORS headers if the origin or method is
+            not allowed so the browser blocks the actual request.
+        """
+        response = HttpResponse()
+        response['Vary'] = 'Origin'
+        entry = self.get_origin_headers(request.headers.get('Origin', ''))
+        if entry is not None:
+            methods, headers = entry
+            if request.headers['Access-Control-Request-Method'].upper() in methods:
+                for name, value in headers:
+                    response.headers[name] = value
+        return response
+
+    def process_request(self, request):
+        """
+        Answer CORS preflight requests with the cached CORS headers of their origin.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        HttpResponse or None
+            The preflight response if the request is a CORS preflight, otherwise None.
+        """
+        if request.method == 'OPTIONS' and 'Access-Control-Request-Method' in request.headers:
+            return self.preflight(request)
         # Pass the request to the next middleware or view
-        return self.get_response(request)
\ No newline at end of file
+        return None
@@ -0,0 +1,144 @@
+from functools import lru_cache
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.http import HttpResponsePermanentRedirect
+from django.urls import is_valid_path
+from django.utils.translation import get_language
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
+
+
+def needs_trailing_slash(urlconf, language, path):
+    """
+    Check whether a path only resolves once a trailing slash is appended.
+
+    Parameters
+    ----------
+    urlconf : str or None
+        The URLconf of the request, None for ``ROOT_URLCONF``.
+    language : str or None
+        The active language. Resolution already uses it; it is an argument so that
+        cached results of ``i18n_patterns`` and translated patterns stay per language.
+    path : str
+        The request's path info.
+
+    Returns
+    -------
+    bool
+        True if the path does not resolve as is but does with a trailing slash.
+    """
+    return not is_valid_path(path, urlconf) and bool(is_valid_path(f'{path}/', urlconf))
+
+
+class CanonicalURLMiddleware(AsyncMiddlewareMixin):
+    """
+    Middleware to redirect requests to their canonical URL in a single hop.
+
+    This middleware replaces ``HTTPSRedirectMiddleware`` and ``TrailingSlashMiddleware``:
+    the scheme, host and trailing slash are all corrected at once, so a request such
+    as ``http://example.com/path`` gets one permanent redirect to
+    ``https://www.example.com/path/`` instead of a chain of them. A slash is only
+    appended when the path does not resolve as is and does with the slash; these
+    resolver checks are kept per path and active language in an LRU cache, cleared
+    whenever a setting such as ``ROOT_URLCONF`` is changed, e.g. by
+    ``override_settings`` in tests.
+
+    Settings
+    --------
+    CANONICAL_HTTPS : bool
+        Redirect plain HTTP requests to HTTPS (default True).
+    CANONICAL_HOST : str
+        Host every request is redirected to, e.g. 'www.example.com' (default None,
+        keep the request's host).
+    CANONICAL_APPEND_SLASH : bool
+        Append a trailing slash to paths that only resolve with one (default True).
+    CANONICAL_SLASH_EXEMPT_PREFIXES : iterable of str
+        Path prefixes never given a trailing slash (default '/admin/').
+    CANONICAL_RESOLVE_CACHE_SIZE : int
+        Number of paths whose resolver check is cached (default 4096).
+    """
+
+    def __init__(self, get_response):
+        """
+        Initialize the middleware with the given get_response callable.
+
+        Parameters
+        ----------
+        get_response : callable
+            The next middleware or view in the chain.
+        """
+        super().__init__(get_response)
+        self.https = getattr(settings, 'CANONICAL_HTTPS', True)
+        self.host = getattr(settings, 'CANONICAL_HOST', None)
+        self.append_slash = getattr(settings, 'CANONICAL_APPEND_SLASH', True)
+        self.slash_exempt_prefixes = tuple(getattr(settings, 'CANONICAL_SLASH_EXEMPT_PREFIXES', ('/admin/',)))
+        self.needs_trailing_slash = lru_cache(
+            maxsize=getattr(settings, 'CANONICAL_RESOLVE_CACHE_SIZE', 4096),
+        )(needs_trailing_slash)
+        # Signals hold a weak reference to the bound method, so this does not keep the
+        # middleware alive
+        setting_changed.connect(self.clear_resolve_cache)
+
+    def clear_resolve_cache(self, **kwargs):
+        """
+        Forget the cached resolver checks when a setting changes.
+
+        Any setting may change how paths resolve, ``ROOT_URLCONF`` or the language
+        settings behind ``i18n_patterns`` among others, and settings only change in
+        tests, so the whole cache is cleared.
+
+        Parameters
+        ----------
+        **kwargs
+            The arguments of the ``setting_changed`` signal.
+        """
+        self.needs_trailing_slash.cache_clear()
+
+    def get_canonical_url(self, request):
+        """
+        Compute the canonical URL of the request.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        str or None
+            The absolute canonical URL, or None if the request is already canonical.
+        """
+        secure = request.is_secure()
+        scheme_changed = self.https and not secure
+        host = request.get_host()
+        host_changed = self.host is not None and host != self.host
+        path = request.path
+        slash_changed = (
+            self.append_slash
+            and not path.endswith('/')
+            and not path.startswith(self.slash_exempt_prefixes)
+            and self.needs_trailing_slash(getattr(request, 'urlconf', None), get_language(), request.path_info)
+        )
+        if not (scheme_changed or host_changed or slash_changed):
+            return None
+        scheme = 'https' if secure or self.https else 'http'
+        return f'{scheme}://{self.host or host}{request.get_full_path(force_append_slash=slash_changed)}'
+
+    def process_request(self, request):
+        """
+        Redirect the request to its canonical URL if needed.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        HttpResponse or None
+            A permanent redirect to the canonical URL, or None to pass the request on.
+        """
+        canonical_url = self.get_canonical_url(request)
+        if canonical_url is not None:
+            return HttpResponsePermanentRedirect(canonical_url)
+        # Pass the request to the next middleware or view
+        return None
@@ -1,6 +1,7 @@
 from django.utils import timezone
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-class CookieConsentMiddleware:
+class CookieConsentMiddleware(AsyncMiddlewareMixin):
     """
     Middleware to handle cookie consent for users.
     
@@ -8,26 +9,17 @@ class CookieConsentMiddleware:
     If not, it sets a default 'cookie_consent' cookie with a value of 'true' and an
     expiration date of one year from the current date.
     """
-    
-    def __init__(self, get_response):
-        """
-        Initialize the middleware with the given get_response callable.
-        
-        Parameters
-        ----------
-        get_response : callable
-            The next middleware or view in the chain.
-        """
-        self.get_response = get_response
 
-    def __call__(self, request):
+    def process_response(self, request, response):
         """
-        Handle the incoming request and set the 'cookie_consent' cookie if not present.
+        Set the 'cookie_consent' cookie if it is not present in the request.
         
         Parameters
         ----------
         request : HttpRequest
             The incoming HTTP request.
+        response : HttpResponse
+            The HTTP response from the next middleware or view.
         
         Returns
         -------
@@ -35,12 +27,7 @@ class CookieConsentMiddleware:
             The HTTP response with the 'cookie_consent' cookie set if it was not present.
         """
         # Check if the 'cookie_consent' cookie is present in the request
-        consent = request.COOKIES.get('cookie_consent')
-        if not consent:
-            # Get the response from the next middleware or view
-            response = self.get_response(request)
+        if not request.COOKIES.get('cookie_consent'):
             # Set a default 'cookie_consent' cookie with a value of 'true' and an expiration date of one year
             response.set_cookie('cookie_consent', 'true', expires=timezone.now() + timezone.timedelta(days=365))
-            return response
-        # Return the response from the next middleware or view if the cookie is already present
-        return self.get_response(request)
\ No newline at end of file
+        return response
\ No newline at end of file
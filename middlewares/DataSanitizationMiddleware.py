@@ -1,43 +1,265 @@
+import json
 import re
+from functools import partialmethod
+from django.conf import settings
+from django.core.exceptions import SuspiciousOperation
+from django.http import HttpResponse, QueryDict
+from django.utils.datastructures import MultiValueDict
+from django.utils.functional import cached_property
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-class DataSanitizationMiddleware:
+# (pattern, replacement) pairs applied to every submitted text value, in order
+DEFAULT_RULES = (
+    # Simple HTML tag removal
+    (r'<[^>]*>', ''),
+)
+# Methods whose body is parsed into request.POST
+BODY_METHODS = frozenset(('POST', 'PUT', 'PATCH'))
+
+# Sanitizing subclasses of request classes, built on first use
+_sanitizing_request_classes = {}
+
+
+class Sanitizer:
+    """
+    Precompiled sanitization rules applied copy-on-write to submitted data.
+
+    A clean value costs one search per rule and is returned as is; only values
+    containing something to remove are rewritten, and containers are only copied
+    when one of their values changed. Patterns are searched one by one rather than
+    combined, so their groups and backreferences keep their own numbering.
+    """
+
+    def __init__(self, rules):
+        """
+        Compile the rules.
+
+        Parameters
+        ----------
+        rules : iterable of tuple
+            (pattern, replacement) pairs, applied in order.
+        """
+        self.rules = tuple((re.compile(pattern), replacement) for pattern, replacement in rules)
+
+    def sanitize_value(self, value):
+        """
+        Sanitize one value.
+
+        Parameters
+        ----------
+        value : object
+            The value; anything but a string is returned unchanged.
+
+        Returns
+        -------
+        object
+            The sanitized value, the same object if nothing was removed.
+        """
+        if not isinstance(value, str) or not any(pattern.search(value) for pattern, _ in self.rules):
+            return value
+        for pattern, replacement in self.rules:
+            value = pattern.sub(replacement, value)
+        return value
+
+    def sanitize_querydict(self, query_dict):
+        """
+        Sanitize the values of a form.
+
+        Parameters
+        ----------
+        query_dict : QueryDict
+            The parsed form.
+
+        Returns
+        -------
+        QueryDict
+            The same QueryDict if no value changed, otherwise an immutable copy with
+            the sanitized values.
+        """
+        changed = {}
+        for key, values in query_dict.lists():
+            sanitized = [self.sanitize_value(value) for value in values]
+            if any(new is not old for new, old in zip(sanitized, values)):
+                changed[key] = sanitized
+        if not changed:
+            return query_dict
+        result = QueryDict(encoding=query_dict.encoding)
+        # The values are already text, so fill the copy directly instead of through
+        # setlist(), which decodes every key and value again
+        MultiValueDict.__init__(result, {key: changed.get(key, values) for key, values in query_dict.lists()})
+        return result
+
+    def sanitize_json(self, data):
+        """
+        Sanitize the strings of a parsed JSON document, keys included.
+
+        Parameters
+        ----------
+        data : object
+            The parsed JSON value.
+
+        Returns
+        -------
+        object
+            The sanitized value; lists and dicts are only copied if something changed.
+
+        Raises
+        ------
+        SuspiciousOperation
+            If two keys of an object are the same once sanitized, as one would
+            silently overwrite the other.
+        """
+        if isinstance(data, str):
+            return self.sanitize_value(data)
+        if isinstance(data, list):
+            items = [self.sanitize_json(item) for item in data]
+            return items if any(new is not old for new, old in zip(items, data)) else data
+        if isinstance(data, dict):
+            items = {self.sanitize_value(key): self.sanitize_json(value) for key, value in data.items()}
+            if len(items) != len(data):
+                raise SuspiciousOperation('JSON object keys collide once sanitized')
+            if all(
+                new_key is old_key and items[new_key] is old_value
+                for new_key, (old_key, old_value) in zip(items, data.items())
+            ):
+                return data
+            return items
+        return data
+
+
+def load_sanitized_post_and_files(request, load_post_and_files):
+    """
+    Parse the form body of the request and sanitize it, on first access to POST or FILES.
+
+    Unlike Django, form bodies of PUT and PATCH requests are parsed as well.
+
+    Parameters
+    ----------
+    request : HttpRequest
+        The incoming HTTP request, of a class from ``get_sanitizing_request_class``.
+    load_post_and_files : callable
+        The parsing method of the original request class.
+    """
+    method = request.method
+    if method in BODY_METHODS and method != 'POST':
+        # Django only parses POST bodies, so present the request as one while parsing
+        request.method = 'POST'
+        try:
+            load_post_and_files(request)
+        finally:
+            request.method = method
+    else:
+        load_post_and_files(request)
+    request._post = request.data_sanitizer.sanitize_querydict(request._post)
+
+
+def load_sanitized_json(request):
+    """
+    Parse the JSON body of the request and sanitize it.
+
+    Parameters
+    ----------
+    request : HttpRequest
+        The incoming HTTP request.
+
+    Returns
+    -------
+    object or None
+        The sanitized document, or None if the body is not valid JSON.
     """
-    Middleware to sanitize data in HTTP POST and PUT requests.
-    
-    This middleware removes HTML tags from the data in POST and PUT requests to prevent
-    XSS (Cross-Site Scripting) attacks.
+    if request.content_type != 'application/json' and not request.content_type.endswith('+json'):
+        return None
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return None
+    return request.data_sanitizer.sanitize_json(data)
+
+
+def get_sanitizing_request_class(request_class):
+    """
+    Get a subclass of the request class whose submitted data is sanitized lazily.
+
+    ``POST`` is sanitized when it is first parsed, and ``json`` is parsed and sanitized
+    on first access, so requests that never read their body pay nothing. Subclasses
+    are built once per request class and reused.
+
+    Parameters
+    ----------
+    request_class : type
+        The class of the incoming request, such as WSGIRequest or ASGIRequest.
+
+    Returns
+    -------
+    type
+        The request subclass.
+    """
+    sanitizing_class = _sanitizing_request_classes.get(request_class)
+    if sanitizing_class is None:
+        sanitizing_class = type(request_class.__name__, (request_class,), {
+            '_load_post_and_files': partialmethod(load_sanitized_post_and_files, request_class._load_post_and_files),
+            'json': cached_property(load_sanitized_json),
+        })
+        _sanitizing_request_classes[request_class] = sanitizing_class
+    return sanitizing_class
+
+
+class DataSanitizationMiddleware(AsyncMiddlewareMixin):
     """
-    
+    Middleware to sanitize data in POST, PUT and PATCH requests.
+
+    This middleware removes HTML tags from submitted form fields (urlencoded and the
+    text parts of multipart bodies) and JSON documents. Sanitization runs once, when
+    the view first reads ``request.POST`` or ``request.json``, and only the values
+    that contain markup are rewritten. Form bodies of PUT and PATCH requests are
+    parsed into ``request.POST`` too. A JSON object whose keys collide once sanitized
+    is rejected with 400 when ``request.json`` is read.
+
+    The rules are read from the ``DATA_SANITIZATION_RULES`` setting, a list of
+    (pattern, replacement) pairs. Non-multipart bodies larger than
+    ``DATA_SANITIZATION_MAX_BODY_SIZE`` bytes (default ``DATA_UPLOAD_MAX_MEMORY_SIZE``)
+    are rejected with 413 before they are read.
+    """
+
     def __init__(self, get_response):
         """
         Initialize the middleware with the given get_response callable.
-        
+
         Parameters
         ----------
         get_response : callable
             The next middleware or view in the chain.
         """
-        self.get_response = get_response
+        super().__init__(get_response)
+        self.sanitizer = Sanitizer(getattr(settings, 'DATA_SANITIZATION_RULES', DEFAULT_RULES))
+        self.max_body_size = getattr(settings, 'DATA_SANITIZATION_MAX_BODY_SIZE', settings.DATA_UPLOAD_MAX_MEMORY_SIZE)
 
-    def __call__(self, request):
+    def process_request(self, request):
         """
-        Handle the incoming request and sanitize the data if the method is POST or PUT.
-        
+        Check the body size and arrange for the submitted data to be sanitized.
+
         Parameters
         ----------
         request : HttpRequest
             The incoming HTTP request.
-        
+
         Returns
         -------
-        HttpResponse
-            The HTTP response from the next middleware or view.
-        """
-        # Check if the request method is POST or PUT
-        if request.method in ['POST', 'PUT']:
-            # Iterate over all POST data items
-            for key, value in request.POST.items():
-                # Remove HTML tags from the data
-                request.POST[key] = re.sub(r'<[^>]*>', '', value)  # Simple HTML tag removal
-        # Get the response from the next middleware or view
-        return self.get_response(request)
\ No newline at end of file
+        HttpResponse or None
+            A 413 response if the body is too large, otherwise None.
+        """
+        if request.method not in BODY_METHODS:
+            return None
+        if self.max_body_size is not None and request.content_type != 'multipart/form-data':
+            try:
+                content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                content_length = 0
+            if content_length > self.max_body_size:
+                return HttpResponse("Request body too large", status=413)
+        request.data_sanitizer = self.sanitizer
+        request.__class__ = get_sanitizing_request_class(request.__class__)
+        if hasattr(request, '_post'):
+            # An earlier middleware already parsed the form
+            request._post = self.sanitizer.sanitize_querydict(request._post)
+        return None
@@ -1,45 +1,288 @@
-import logging
-from django.db import connection
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from functools import lru_cache
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from middlewares.StructuredLogger import StructuredLogger
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-logger = logging.getLogger(__name__)
+# Patterns of SQL literals replaced by '?' when fingerprinting, in order
+LITERAL_PATTERNS = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    # Collapse IN lists of any length so they share one fingerprint
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?)'),
+    (re.compile(r'\s+'), ' '),
+)
 
-class DatabaseQueryLoggingMiddleware:
+
+@lru_cache(maxsize=1024)
+def fingerprint_sql(sql):
+    """
+    Normalize a SQL statement so queries differing only by literals compare equal.
+
+    Applications only issue a limited set of distinct statements, so results are cached.
+
+    Parameters
+    ----------
+    sql : str
+        The SQL statement.
+
+    Returns
+    -------
+    str
+        The statement with literals and placeholders replaced by '?'.
+    """
+    for pattern, replacement in LITERAL_PATTERNS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+class QueryStats:
+    """
+    Database query statistics collected for a single request.
+
+    An instance is installed as an execute wrapper on every database connection
+    while the request is processed, so it sees each query whether or not DEBUG is on,
+    and keeps only counters rather than every SQL string. Slow queries are grouped by
+    fingerprint: the first occurrence keeps its SQL and plan, repeats only update the
+    counters, and fingerprints beyond ``max_slow`` are counted as overflow.
+    """
+
+    def __init__(self, slow_threshold, explain, max_slow):
+        """
+        Initialize empty statistics.
+
+        Parameters
+        ----------
+        slow_threshold : float
+            Duration in milliseconds above which a query is recorded as slow.
+        explain : bool
+            Whether to capture the query plan of slow SELECT queries.
+        max_slow : int
+            Maximum number of distinct slow query fingerprints recorded.
+        """
+        self.slow_threshold = slow_threshold
+        self.explain = explain
+        self.max_slow = max_slow
+        self.count = 0
+        self.total_time = 0.0
+        self.fingerprints = Counter()
+        # Fingerprint -> slow query entry, in order of first occurrence
+        self.slow_queries = {}
+        self.slow_overflow = 0
+        self.explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        """
+        Run a query and record its duration and fingerprint.
+
+        Parameters
+        ----------
+        execute : callable
+            The next execute wrapper or the cursor's execute method.
+        sql : str
+            The SQL statement.
+        params : list or tuple
+            The query parameters.
+        many : bool
+            Whether this is an executemany call.
+        context : dict
+            The connection and cursor the query runs on.
+
+        Returns
+        -------
+        object
+            The result of the execute call.
+        """
+        # The EXPLAIN of a slow query goes through this wrapper too
+        if self.explaining:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - start) * 1000
+            self.count += 1
+            self.total_time += duration
+            fingerprint = fingerprint_sql(sql)
+            self.fingerprints[fingerprint] += 1
+            if duration >= self.slow_threshold:
+                self.record_slow_query(fingerprint, sql, params, many, duration, context['connection'])
+
+    def record_slow_query(self, fingerprint, sql, params, many, duration, connection):
+        """
+        Record a slow query, with its plan if EXPLAIN capture is enabled.
+
+        Only the first occurrence of a fingerprint is explained; repeats update its
+        count and durations.
+
+        Parameters
+        ----------
+        fingerprint : str
+            The normalized statement, from ``fingerprint_sql``.
+        sql : str
+            The SQL statement.
+        params : list or tuple
+            The query parameters.
+        many : bool
+            Whether this was an executemany call.
+        duration : float
+            The duration of the query in milliseconds.
+        connection : BaseDatabaseWrapper
+            The connection the query ran on.
+        """
+        slow_query = self.slow_queries.get(fingerprint)
+        if slow_query is not None:
+            slow_query['count'] += 1
+            slow_query['total_ms'] += duration
+            slow_query['max_ms'] = max(slow_query['max_ms'], duration)
+            return
+        if len(self.slow_queries) >= self.max_slow:
+            self.slow_overflow += 1
+            return
+        slow_query = {'sql': sql, 'count': 1, 'total_ms': duration, 'max_ms': duration}
+        if self.explain and not many and sql.lstrip()[:6].upper() == 'SELECT':
+            self.explaining = True
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+                    slow_query['plan'] = list(cursor.fetchall())
+            except Exception as e:
+                slow_query['plan_error'] = str(e)
+            finally:
+                self.explaining = False
+        self.slow_queries[fingerprint] = slow_query
+
+    def summary(self, repeat_threshold):
+        """
+        Summarize the statistics of the request.
+
+        Parameters
+        ----------
+        repeat_threshold : int
+            Number of executions of one fingerprint flagged as a likely N+1 pattern.
+
+        Returns
+        -------
+        dict
+            The query count, total database time, repeated fingerprints, slow queries
+            and the number of slow queries beyond the recorded fingerprints.
+        """
+        return {
+            'queries': self.count,
+            'db_time_ms': round(self.total_time, 3),
+            'repeated': [
+                {'fingerprint': fingerprint, 'count': count}
+                for fingerprint, count in self.fingerprints.most_common()
+                if count >= repeat_threshold
+            ],
+            'slow': [
+                {**slow_query, 'total_ms': round(slow_query['total_ms'], 3), 'max_ms': round(slow_query['max_ms'], 3)}
+                for slow_query in self.slow_queries.values()
+            ],
+            'slow_overflow': self.slow_overflow,
+        }
+
+
+class DatabaseQueryLoggingMiddleware(AsyncMiddlewareMixin):
     """
     Middleware to log database queries for each HTTP request.
-    
-    This middleware logs all database queries executed during the processing
-    of an HTTP request. It is useful for debugging and performance monitoring.
+
+    This middleware logs a compact summary of the database queries executed during
+    the processing of an HTTP request: the number of queries, the total database
+    time, fingerprints repeated often enough to suggest an N+1 pattern, and slow
+    queries. It uses execute wrappers, so it works without DEBUG.
+
+    The thresholds are read from the ``DB_QUERY_REPEAT_THRESHOLD`` (default 5),
+    ``DB_SLOW_QUERY_MS`` (default 100), ``DB_SLOW_QUERY_EXPLAIN`` (default False) and
+    ``DB_SLOW_QUERY_MAX`` (default 20, the distinct slow queries kept per request)
+    settings.
     """
-    
+
     def __init__(self, get_response):
         """
         Initialize the middleware with the given get_response callable.
-        
+
         Parameters
         ----------
         get_response : callable
             The next middleware or view in the chain.
         """
-        self.get_response = get_response
+        super().__init__(get_response)
+        self.logger = StructuredLogger(__name__, 'DatabaseQueryLoggingMiddleware')
+        self.repeat_threshold = getattr(settings, 'DB_QUERY_REPEAT_THRESHOLD', 5)
+        self.slow_threshold = getattr(settings, 'DB_SLOW_QUERY_MS', 100)
+        self.explain = getattr(settings, 'DB_SLOW_QUERY_EXPLAIN', False)
+        self.max_slow = getattr(settings, 'DB_SLOW_QUERY_MAX', 20)
 
-    def __call__(self, request):
+    def handle(self, request):
         """
-        Handle the incoming request and log the database queries.
-        
+        Handle the incoming request and log a summary of its database queries.
+
         Parameters
         ----------
         request : HttpRequest
             The incoming HTTP request.
-        
+
         Returns
         -------
         HttpResponse
             The HTTP response from the next middleware or view.
         """
-        # Get the response from the next middleware or view
-        response = self.get_response(request)
-        # Retrieve the list of database queries executed during the request
-        queries = connection.queries
-        # Log the database queries
-        logger.info(f'Database queries: {queries}')
-        return response
\ No newline at end of file
+        stats = QueryStats(self.slow_threshold, self.explain, self.max_slow)
+        # Wrap every connection for the duration of the request
+        with ExitStack() as stack:
+            self.wrap_connections(stack, stats)
+            # Get the response from the next middleware or view
+            response = self.get_response(request)
+        # Log the summary of the database queries
+        self.logger.log('database_queries', path=request.path, **stats.summary(self.repeat_threshold))
+        return response
+
+    async def ahandle(self, request):
+        """
+        Async counterpart of ``handle``, used when the middleware chain runs under ASGI.
+
+        Database connections belong to a thread, and under ASGI the async ORM runs the
+        queries of a request on that request's thread-sensitive worker thread, so the
+        wrappers are installed and removed on that thread rather than the event loop's.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        HttpResponse
+            The HTTP response from the next middleware or view.
+        """
+        stats = QueryStats(self.slow_threshold, self.explain, self.max_slow)
+        stack = ExitStack()
+        await sync_to_async(self.wrap_connections)(stack, stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self.logger.log('database_queries', path=request.path, **stats.summary(self.repeat_threshold))
+        return response
+
+    @staticmethod
+    def wrap_connections(stack, stats):
+        """
+        Install the statistics wrapper on every connection of the calling thread.
+
+        Parameters
+        ----------
+        stack : ExitStack
+            The stack that removes the wrappers when closed.
+        stats : QueryStats
+            The statistics of the request.
+        """
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
\ No newline at end of file
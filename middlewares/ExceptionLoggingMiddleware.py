@@ -1,48 +1,277 @@
-from django.http import HttpResponse
+import hashlib
 import logging
+import os
+import sys
+import threading
+import time
+from functools import lru_cache
+from django.conf import settings
+from django.http import HttpResponse
+from middlewares.StructuredLogger import StructuredLogger
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
+
+
+@lru_cache(maxsize=None)
+def normalize_filename(filename):
+    """
+    Strip the import path prefix from a source file name.
+
+    The same code then has the same location in every worker and virtualenv.
+
+    Parameters
+    ----------
+    filename : str
+        The file name of a code object.
+
+    Returns
+    -------
+    str
+        The file name relative to the longest matching ``sys.path`` entry.
+    """
+    prefixes = [path for path in sys.path if path and filename.startswith(path.rstrip(os.sep) + os.sep)]
+    if not prefixes:
+        return filename
+    return filename[len(max(prefixes, key=len).rstrip(os.sep)) + 1:]
+
+
+def get_exception_key(exception):
+    """
+    Get the identity of an exception: its type and the code locations of its traceback.
+
+    Messages are left out, as they often contain ids or values that differ from one
+    occurrence to the next.
+
+    Parameters
+    ----------
+    exception : BaseException
+        The exception.
+
+    Returns
+    -------
+    tuple
+        The exception type followed by a (file name, function name, line number)
+        triple per frame.
+    """
+    key = [type(exception)]
+    tb = exception.__traceback__
+    while tb is not None:
+        # Strings cache their hash, unlike code objects, so repeats hash cheaply
+        code = tb.tb_frame.f_code
+        key.append((code.co_filename, code.co_name, tb.tb_lineno))
+        tb = tb.tb_next
+    return tuple(key)
+
+
+def get_fingerprint(key):
+    """
+    Compute the printable fingerprint of an exception key.
+
+    Parameters
+    ----------
+    key : tuple
+        A key from ``get_exception_key``.
+
+    Returns
+    -------
+    str
+        A short hex digest, the same in every worker for the same code.
+    """
+    exception_type, *frames = key
+    parts = [f'{exception_type.__module__}.{exception_type.__qualname__}']
+    parts.extend(f'{normalize_filename(filename)}:{name}:{lineno}' for filename, name, lineno in frames)
+    return hashlib.blake2b('|'.join(parts).encode(), digest_size=8).hexdigest()
 
-logger = logging.getLogger(__name__)
 
-class ExceptionLoggingMiddleware:
+class ExceptionTable:
+    """
+    Bounded table of the exceptions seen in the current window, by fingerprint.
+
+    The first occurrence of an exception in a window is reported as new; repeats only
+    increment its counter. When the table is full, exceptions it does not already
+    hold are counted together as overflow.
+    """
+
+    def __init__(self, window, max_size):
+        """
+        Initialize the table.
+
+        Parameters
+        ----------
+        window : float
+            Length of a window in seconds.
+        max_size : int
+            Maximum number of fingerprints held per window.
+        """
+        self.window = window
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        # Exception key -> [fingerprint, type name, occurrences in the window]
+        self.entries = {}
+        self.overflow = 0
+        self.window_end = time.monotonic() + window
+
+    def record(self, exception):
+        """
+        Count an occurrence of an exception.
+
+        Parameters
+        ----------
+        exception : BaseException
+            The exception.
+
+        Returns
+        -------
+        tuple
+            (fingerprint, first): the fingerprint, None when the table is full, and
+            whether this is the first occurrence in the window.
+        """
+        key = get_exception_key(exception)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry[2] += 1
+                return entry[0], False
+            if len(self.entries) >= self.max_size:
+                self.overflow += 1
+                return None, False
+            fingerprint = get_fingerprint(key)
+            self.entries[key] = [fingerprint, type(exception).__qualname__, 1]
+            return fingerprint, True
+
+    def rotate(self):
+        """
+        Start a new window if the current one has ended.
+
+        Returns
+        -------
+        dict or None
+            The counts of the ended window, or None if it has not ended or nothing
+            happened in it.
+        """
+        if time.monotonic() < self.window_end:
+            return None
+        with self.lock:
+            now = time.monotonic()
+            if now < self.window_end:
+                # Another thread rotated the table while this one waited
+                return None
+            entries, overflow = self.entries, self.overflow
+            self.entries = {}
+            self.overflow = 0
+            self.window_end = now + self.window
+        if not entries and not overflow:
+            return None
+        counts = sorted(entries.values(), key=lambda entry: entry[2], reverse=True)
+        return {
+            'exceptions': [
+                {'fingerprint': fingerprint, 'type': type_name, 'count': count}
+                for fingerprint, type_name, count in counts
+            ],
+            'overflow': overflow,
+        }
+
+
+class ExceptionLoggingMiddleware(AsyncMiddlewareMixin):
     """
     Middleware to log exceptions for each HTTP request.
-    
+
     This middleware logs any unhandled exceptions that occur during the processing
     of an HTTP request. It is useful for debugging and error monitoring.
+
+    Exceptions are fingerprinted by type and traceback locations. Within a window of
+    ``EXCEPTION_LOG_WINDOW`` seconds (default 60) only the first occurrence of each
+    fingerprint is logged with its traceback; repeats are counted, and at the end of
+    the window an ``exception_summary`` record reports the counts. At most
+    ``EXCEPTION_LOG_MAX_FINGERPRINTS`` (default 1000) fingerprints are tracked per
+    window; beyond that, new exceptions are logged without a traceback.
     """
-    
+
     def __init__(self, get_response):
         """
         Initialize the middleware with the given get_response callable.
-        
+
         Parameters
         ----------
         get_response : callable
             The next middleware or view in the chain.
         """
-        self.get_response = get_response
+        super().__init__(get_response)
+        self.logger = StructuredLogger(__name__, 'ExceptionLoggingMiddleware')
+        self.window = getattr(settings, 'EXCEPTION_LOG_WINDOW', 60)
+        self.exceptions = ExceptionTable(self.window, getattr(settings, 'EXCEPTION_LOG_MAX_FINGERPRINTS', 1000))
 
-    def __call__(self, request):
+    def log_exception(self, request, exception):
         """
-        Handle the incoming request and log any unhandled exceptions.
-        
+        Log an unhandled exception, with its traceback only if it is new in the window.
+
         Parameters
         ----------
         request : HttpRequest
             The incoming HTTP request.
-        
+        exception : Exception
+            The unhandled exception.
+        """
+        fingerprint, first = self.exceptions.record(exception)
+        if first:
+            self.logger.log(
+                'unhandled_exception', level=logging.ERROR,
+                # Under ASGI the hook runs in a worker thread, outside the except block
+                exc_info=(type(exception), exception, exception.__traceback__),
+                path=request.path, error=str(exception), fingerprint=fingerprint,
+            )
+        elif fingerprint is None:
+            self.logger.log(
+                'unhandled_exception', level=logging.ERROR,
+                path=request.path, error_type=type(exception).__qualname__, error=str(exception),
+            )
+
+    def log_summary(self):
+        """
+        Log the exception counts of the window if it has ended.
+        """
+        summary = self.exceptions.rotate()
+        if summary is not None:
+            self.logger.log('exception_summary', level=logging.WARNING, window=self.window, **summary)
+
+    def process_exception(self, request, exception):
+        """
+        Log an unhandled exception raised by the view and return an error response.
+
+        Django calls this hook before turning the exception into a response, so the
+        exception is neither logged again with its traceback by ``django.request``.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+        exception : Exception
+            The unhandled exception.
+
         Returns
         -------
         HttpResponse
-            The HTTP response from the next middleware or view, or an error response
-            if an unhandled exception occurs.
-        """
-        try:
-            # Get the response from the next middleware or view
-            response = self.get_response(request)
-            return response
-        except Exception as e:
-            # Log the unhandled exception
-            logger.error(f'Unhandled exception: {e}', exc_info=True)
-            # Return an HTTP 500 Internal Server Error response
-            return HttpResponse("Internal Server Error", status=500)
\ No newline at end of file
+            An HTTP 500 Internal Server Error response.
+        """
+        # Log the unhandled exception
+        self.log_exception(request, exception)
+        # Return an HTTP 500 Internal Server Error response
+        return HttpResponse("Internal Server Error", status=500)
+
+    def process_response(self, request, response):
+        """
+        Log the exception counts of the window once it has ended.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+        response : HttpResponse
+            The HTTP response from the next middleware or view.
+
+        Returns
+        -------
+        HttpResponse
+            The same response.
+        """
+        self.log_summary()
+        return response
@@ -1,48 +1,233 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
 from django.contrib.gis.geoip2 import GeoIP2
+from django.utils.functional import cached_property
+from geoip2.database import MODE_MMAP
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-class GeoIPMiddleware:
+# Process-wide GeoIP2 reader, shared by every middleware instance and thread
+_geoip_reader = None
+_geoip_reader_lock = threading.Lock()
+
+# Request subclasses with a lazy geo_location attribute, by original request class
+_lazy_request_classes = {}
+
+
+def get_geoip_reader():
+    """
+    Get the process-wide GeoIP2 reader, opening the databases on first use.
+
+    The databases are opened in memory-map mode, so workers forked after the reader
+    is created share the same pages instead of each reading the files.
+
+    Returns
+    -------
+    GeoIP2
+        The shared GeoIP2 reader.
+    """
+    global _geoip_reader
+    if _geoip_reader is None:
+        with _geoip_reader_lock:
+            if _geoip_reader is None:
+                _geoip_reader = GeoIP2(cache=MODE_MMAP)
+    return _geoip_reader
+
+
+class GeoIPLookupCache:
+    """
+    Bounded LRU cache of IP address to location lookups, with a time to live.
+
+    Failed lookups are cached as None too, so addresses missing from the database
+    (private ranges, for example) are not looked up again on every request. Hits and
+    misses are counted so the hit rate can be checked with ``stats``. Every caller
+    gets its own copy of a location, so a request that modifies it does not change
+    what later requests for the same address see.
+    """
+
+    def __init__(self, max_entries=10000, ttl=3600):
+        """
+        Initialize an empty cache.
+
+        Parameters
+        ----------
+        max_entries : int, optional
+            The maximum number of cached addresses.
+        ttl : float, optional
+            Seconds a lookup result stays valid.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def lookup(self, ip, resolve):
+        """
+        Get the location of an IP address, resolving and caching it on a miss.
+
+        Parameters
+        ----------
+        ip : str
+            The IP address.
+        resolve : callable
+            Called with the IP address on a miss; returns the location or raises.
+
+        Returns
+        -------
+        dict or None
+            A copy of the location data, or None if the lookup failed.
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(ip)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                self.entries.move_to_end(ip)
+                location = entry[1]
+                # Locations are flat dicts of strings and numbers, a shallow copy will do
+                return dict(location) if location is not None else None
+            self.misses += 1
+        # Resolve outside the lock so other threads are not held up by the database
+        try:
+            location = resolve(ip)
+        except Exception:
+            location = None
+        with self.lock:
+            self.entries[ip] = (now + self.ttl, location)
+            self.entries.move_to_end(ip)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return dict(location) if location is not None else None
+
+    def stats(self):
+        """
+        Report the cache usage and hit rate.
+
+        Returns
+        -------
+        dict
+            The number of hits, misses and entries, and the hit rate.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self.entries),
+            }
+
+
+def resolve_geo_location(request):
+    """
+    Look up the location of the request's client with the middleware that handled it.
+
+    Parameters
+    ----------
+    request : HttpRequest
+        The incoming HTTP request.
+
+    Returns
+    -------
+    dict or None
+        The location data, or None if the lookup failed.
+    """
+    return request.geoip_middleware.lookup(request)
+
+
+def get_lazy_request_class(request_class):
+    """
+    Get a subclass of the request class whose ``geo_location`` is resolved on first access.
+
+    ``geo_location`` is a cached property, so the lookup runs at most once per request
+    and the attribute is a plain value afterwards, None included. Subclasses are built
+    once per request class and reused.
+
+    Parameters
+    ----------
+    request_class : type
+        The class of the incoming request, such as WSGIRequest or ASGIRequest.
+
+    Returns
+    -------
+    type
+        The request subclass with the lazy attribute.
+    """
+    lazy_class = _lazy_request_classes.get(request_class)
+    if lazy_class is None:
+        geo_location = cached_property(resolve_geo_location)
+        lazy_class = type(request_class.__name__, (request_class,), {'geo_location': geo_location})
+        _lazy_request_classes[request_class] = lazy_class
+    return lazy_class
+
+
+class GeoIPMiddleware(AsyncMiddlewareMixin):
     """
     Middleware to add GeoIP location data to HTTP requests.
-    
+
     This middleware uses the GeoIP2 library to add location data to each incoming HTTP request
-    based on the client's IP address.
+    based on the client's IP address. A single memory-mapped reader is shared by the
+    whole process, and results are kept in an LRU cache sized by the
+    ``GEOIP_CACHE_ENTRIES`` setting and expired after ``GEOIP_CACHE_TTL`` seconds.
+
+    ``request.geo_location`` is resolved lazily on first access, so views that never
+    read it do not pay for the lookup.
     """
-    
+
     def __init__(self, get_response):
         """
         Initialize the middleware with the given get_response callable.
-        
+
         Parameters
         ----------
         get_response : callable
             The next middleware or view in the chain.
         """
-        self.get_response = get_response
+        super().__init__(get_response)
+        # Open the databases at startup rather than on the first request
+        self.geo_ip = get_geoip_reader()
+        self.lookup_cache = GeoIPLookupCache(
+            max_entries=getattr(settings, 'GEOIP_CACHE_ENTRIES', 10000),
+            ttl=getattr(settings, 'GEOIP_CACHE_TTL', 3600),
+        )
 
-    def __call__(self, request):
+    def process_request(self, request):
         """
-        Handle the incoming request and add GeoIP location data.
-        
+        Add GeoIP location data to the request.
+
         Parameters
         ----------
         request : HttpRequest
             The incoming HTTP request.
-        
+
         Returns
         -------
-        HttpResponse
-            The HTTP response from the next middleware or view.
+        None
+            The request is always passed on to the next middleware or view.
+        """
+        # Defer the lookup until request.geo_location is first read; it reads a
+        # memory-mapped file, so it stays synchronous under ASGI too
+        request.geoip_middleware = self
+        request.__class__ = get_lazy_request_class(request.__class__)
+        return None
+
+    def lookup(self, request):
+        """
+        Look up the location of the request's client.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        dict or None
+            The location data, or None if the lookup failed.
         """
-        geo_ip = GeoIP2()
         # Get the client's IP address, default to localhost if not found
         ip = request.META.get('REMOTE_ADDR', '127.0.0.1')
-        try:
-            # Get the location data for the IP address
-            location = geo_ip.city(ip)
-            # Add the location data to the request object
-            request.geo_location = location
-        except Exception:
-            # If an error occurs, set the location data to None
-            request.geo_location = None
-        # Get the response from the next middleware or view
-        return self.get_response(request)
\ No newline at end of file
+        return self.lookup_cache.lookup(ip, self.geo_ip.city)
\ No newline at end of file
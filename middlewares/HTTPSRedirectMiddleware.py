@@ -1,36 +1,26 @@
 from django.http import HttpResponsePermanentRedirect
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-class HTTPSRedirectMiddleware:
+class HTTPSRedirectMiddleware(AsyncMiddlewareMixin):
     """
     Middleware to redirect HTTP requests to HTTPS.
     
     This middleware ensures that all incoming HTTP requests are redirected to HTTPS.
     """
-    
-    def __init__(self, get_response):
-        """
-        Initialize the middleware with the given get_response callable.
-        
-        Parameters
-        ----------
-        get_response : callable
-            The next middleware or view in the chain.
-        """
-        self.get_response = get_response
 
-    def __call__(self, request):
+    def process_request(self, request):
         """
-        Handle the incoming request and redirect to HTTPS if the request is not secure.
-        
+        Redirect to HTTPS if the request is not secure.
+
         Parameters
         ----------
         request : HttpRequest
             The incoming HTTP request.
-        
+
         Returns
         -------
-        HttpResponse
-            The HTTP response, potentially redirected to HTTPS.
+        HttpResponse or None
+            A redirect to HTTPS, or None to pass the request on.
         """
         # Check if the request is not secure (HTTP)
         if not request.is_secure():
@@ -39,4 +29,4 @@ class HTTPSRedirectMiddleware:
             # Redirect to the secure URL
             return HttpResponsePermanentRedirect(secure_url)
         # Pass the request to the next middleware or view
-        return self.get_response(request)
\ No newline at end of file
+        return None
\ No newline at end of file
@@ -0,0 +1,219 @@
+import secrets
+from django.conf import settings
+from django.http.response import ResponseHeaders
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
+
+# Placeholder replaced by the request's CSP nonce in header values
+NONCE_PLACEHOLDER = '{nonce}'
+
+# Headers of CORSHeaders, ContentSecurityPolicy, XSSProtection, SEOOptimization and CustomHeader
+DEFAULT_HEADER_POLICY = [
+    {
+        'path': '/',
+        'set': {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+            'Content-Security-Policy': "default-src 'self';",
+            'X-XSS-Protection': '1; mode=block',
+            'X-Robots-Tag': 'index, follow',
+            'X-UA-Compatible': 'IE=edge',
+            'X-Custom-Header': 'MyValue',
+        },
+    },
+]
+
+
+class HeaderPolicy:
+    """
+    Headers set and removed on the responses under one path prefix, compiled once.
+
+    Headers are stored the way ``ResponseHeaders`` stores them, by lowercased name,
+    so applying a policy copies entries that were already converted and validated.
+    """
+
+    __slots__ = ('prefix', 'set_headers', 'remove_headers', 'nonce_headers')
+
+    def __init__(self, prefix, set_headers, remove_headers, nonce_headers):
+        """
+        Initialize the policy.
+
+        Parameters
+        ----------
+        prefix : str
+            The URL prefix the policy applies to.
+        set_headers : dict
+            The static headers to set, as (name, value) pairs by lowercased name.
+        remove_headers : tuple of str
+            Lowercased names of the headers to remove.
+        nonce_headers : tuple
+            (lowercased name, name, template) triples of the headers that carry the
+            CSP nonce, substituted for the placeholder in the template.
+        """
+        self.prefix = prefix
+        self.set_headers = set_headers
+        self.remove_headers = remove_headers
+        self.nonce_headers = nonce_headers
+
+    @classmethod
+    def compile(cls, rule):
+        """
+        Build a policy from a rule of the ``HEADER_POLICY`` setting.
+
+        Header names and values are validated here, so invalid settings fail at startup
+        rather than on a request.
+
+        Parameters
+        ----------
+        rule : dict
+            The rule, with ``path``, ``set`` and ``remove`` entries.
+
+        Returns
+        -------
+        HeaderPolicy
+            The compiled policy.
+        """
+        headers = rule.get('set', {})
+        # Raises BadHeaderError or UnicodeError for values Django would refuse; nonces
+        # are URL-safe, so a sample one validates every nonce the template will get
+        sample_nonce = secrets.token_urlsafe(16)
+        converted = ResponseHeaders({
+            name: value.replace(NONCE_PLACEHOLDER, sample_nonce) for name, value in headers.items()
+        })._store
+        set_headers = {}
+        nonce_headers = []
+        for name, value in headers.items():
+            key = name.lower()
+            if NONCE_PLACEHOLDER in value:
+                nonce_headers.append((key, converted[key][0], value))
+            else:
+                set_headers[key] = converted[key]
+        return cls(
+            rule.get('path', '/'),
+            set_headers,
+            tuple(name.lower() for name in rule.get('remove', ())),
+            tuple(nonce_headers),
+        )
+
+
+class HeaderPolicyMiddleware(AsyncMiddlewareMixin):
+    """
+    Middleware to apply the response header policy configured in settings.
+
+    This middleware replaces ``CORSHeadersMiddleware``, ``ContentSecurityPolicyMiddleware``,
+    ``XSSProtectionMiddleware``, ``SEOOptimizationMiddleware`` and ``CustomHeaderMiddleware``
+    with a single pass over headers compiled at startup. Rules are read from the
+    ``HEADER_POLICY`` setting, a list of dicts checked in order; the first rule whose
+    ``path`` prefix matches the request applies. Each rule accepts:
+
+    - ``path``: URL prefix the rule applies to (default ``'/'``).
+    - ``set``: dict of header names to values, overriding those set by the view.
+    - ``remove``: header names removed from the response.
+
+    A value may contain ``'nonce-{nonce}'``, in which case requests under the rule get
+    a fresh ``request.csp_nonce`` for templates, substituted in the header. The nonce
+    is generated before the view runs, so templates rendered after this middleware,
+    such as those of a ``TemplateResponse`` or a streamed body, use the same one.
+
+    Without the setting, every response gets the headers of the middlewares above.
+    """
+
+    def __init__(self, get_response):
+        """
+        Initialize the middleware with the given get_response callable and compile the policy.
+
+        Parameters
+        ----------
+        get_response : callable
+            The next middleware or view in the chain.
+        """
+        super().__init__(get_response)
+        rules = getattr(settings, 'HEADER_POLICY', None) or DEFAULT_HEADER_POLICY
+        self.policies = tuple(HeaderPolicy.compile(rule) for rule in rules)
+
+    def get_policy(self, request):
+        """
+        Get the first policy whose prefix matches the request path.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        HeaderPolicy or None
+            The matching policy, or None if no rule applies.
+        """
+        path = request.path
+        for policy in self.policies:
+            if path.startswith(policy.prefix):
+                return policy
+        return None
+
+    def handle(self, request):
+        """
+        Handle the incoming request and apply the matching header policy to the response.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        HttpResponse
+            The HTTP response with the policy's headers applied.
+        """
+        policy = self.get_policy(request)
+        if policy is not None and policy.nonce_headers:
+            request.csp_nonce = secrets.token_urlsafe(16)
+        # Get the response from the next middleware or view
+        response = self.get_response(request)
+        if policy is not None:
+            self.apply(policy, request, response)
+        return response
+
+    async def ahandle(self, request):
+        """
+        Async counterpart of ``handle``, used when the middleware chain runs under ASGI.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        HttpResponse
+            The HTTP response with the policy's headers applied.
+        """
+        policy = self.get_policy(request)
+        if policy is not None and policy.nonce_headers:
+            request.csp_nonce = secrets.token_urlsafe(16)
+        response = await self.get_response(request)
+        if policy is not None:
+            self.apply(policy, request, response)
+        return response
+
+    @staticmethod
+    def apply(policy, request, response):
+        """
+        Set and remove the headers of a policy on a response.
+
+        Parameters
+        ----------
+        policy : HeaderPolicy
+            The policy to apply.
+        request : HttpRequest
+            The incoming HTTP request.
+        response : HttpResponse
+            The HTTP response.
+        """
+        # Write to the store directly, the values were validated when compiled
+        store = response.headers._store
+        store.update(policy.set_headers)
+        for key, name, template in policy.nonce_headers:
+            store[key] = (name, template.replace(NONCE_PLACEHOLDER, request.csp_nonce))
+        for key in policy.remove_headers:
+            store.pop(key, None)
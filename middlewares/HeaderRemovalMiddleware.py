@@ -1,39 +1,29 @@
-class HeaderRemovalMiddleware:
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
+
+class HeaderRemovalMiddleware(AsyncMiddlewareMixin):
     """
     Middleware to remove specific headers from HTTP requests.
     
     This middleware removes the 'X-Powered-By' header from incoming HTTP requests
     to enhance security by obscuring the server technology.
     """
-    
-    def __init__(self, get_response):
-        """
-        Initialize the middleware with the given get_response callable.
-        
-        Parameters
-        ----------
-        get_response : callable
-            The next middleware or view in the chain.
-        """
-        self.get_response = get_response
 
-    def __call__(self, request):
+    def process_request(self, request):
         """
-        Handle the incoming request and remove the 'X-Powered-By' header if present.
-        
+        Remove the 'X-Powered-By' header if present.
+
         Parameters
         ----------
         request : HttpRequest
             The incoming HTTP request.
-        
+
         Returns
         -------
-        HttpResponse
-            The HTTP response from the next middleware or view.
+        None
+            The request is always passed on to the next middleware or view.
         """
         # Check if the 'X-Powered-By' header is present in the request
         if 'X-Powered-By' in request.META:
             # Remove the 'X-Powered-By' header
             del request.META['X-Powered-By']
-        # Get the response from the next middleware or view
-        return self.get_response(request)
\ No newline at end of file
+        return None
\ No newline at end of file
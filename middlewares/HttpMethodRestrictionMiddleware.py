@@ -1,47 +1,215 @@
+from django.conf import settings
 from django.http import HttpResponseNotAllowed
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-class HttpMethodRestrictionMiddleware:
+# Methods a path accepts unless a rule says otherwise
+STANDARD_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+
+
+class MethodRule:
+    """
+    Methods restricted under one path prefix.
+
+    A rule either denies a list of methods, letting any other method through,
+    non-standard ones such as PROPFIND included, or allows only a list of methods.
+    """
+
+    __slots__ = ('allowed', 'denied')
+
+    def __init__(self, allowed=None, denied=()):
+        """
+        Build the rule.
+
+        Parameters
+        ----------
+        allowed : iterable of str, optional
+            The only methods accepted, None to accept any method not denied.
+        denied : iterable of str, optional
+            The methods refused.
+        """
+        self.allowed = None if allowed is None else frozenset(allowed)
+        self.denied = frozenset(denied)
+
+    def permits(self, method):
+        """
+        Check whether the rule lets a method through.
+
+        Parameters
+        ----------
+        method : str
+            The request method.
+
+        Returns
+        -------
+        bool
+            True if the method is accepted.
+        """
+        return method not in self.denied and (self.allowed is None or method in self.allowed)
+
+    @classmethod
+    def from_setting(cls, value):
+        """
+        Build a rule from a value of the ``HTTP_METHOD_RESTRICTIONS`` setting.
+
+        Parameters
+        ----------
+        value : iterable of str or dict
+            The restricted methods, or a dict with the ``allow`` list of the only
+            methods accepted.
+
+        Returns
+        -------
+        MethodRule
+            The rule.
+        """
+        if isinstance(value, dict):
+            return cls(allowed=(method.upper() for method in value['allow']))
+        return cls(denied=(method.upper() for method in value))
+
+
+class PathPrefixTrie:
+    """
+    Character trie mapping path prefixes to values.
+
+    A lookup walks the path once and yields the value of every stored prefix along
+    the way, so its cost depends on the path length and not on the number of prefixes
+    stored.
+    """
+
+    __slots__ = ('root',)
+
+    def __init__(self, items=()):
+        """
+        Build the trie.
+
+        Parameters
+        ----------
+        items : iterable of tuple
+            (prefix, value) pairs.
+        """
+        # Each node is [children by character, value or None]
+        self.root = [{}, None]
+        for prefix, value in items:
+            self.insert(prefix, value)
+
+    def insert(self, prefix, value):
+        """
+        Store a value under a prefix, replacing any previous value.
+
+        Parameters
+        ----------
+        prefix : str
+            The path prefix.
+        value : object
+            The value, not None.
+        """
+        node = self.root
+        for char in prefix:
+            children = node[0]
+            child = children.get(char)
+            if child is None:
+                child = children[char] = [{}, None]
+            node = child
+        node[1] = value
+
+    def matches(self, path):
+        """
+        Yield the values of the stored prefixes of a path, shortest prefix first.
+
+        Parameters
+        ----------
+        path : str
+            The request path.
+
+        Yields
+        ------
+        object
+            The value of each matching prefix.
+        """
+        node = self.root
+        if node[1] is not None:
+            yield node[1]
+        for char in path:
+            node = node[0].get(char)
+            if node is None:
+                return
+            if node[1] is not None:
+                yield node[1]
+
+
+class HttpMethodRestrictionMiddleware(AsyncMiddlewareMixin):
     """
     Middleware to restrict HTTP methods for specific paths.
-    
+
     This middleware restricts certain HTTP methods (e.g., POST, DELETE) for specific
     paths in the application. If a restricted method is used, a 405 Method Not Allowed
-    response is returned.
+    response is returned with an ``Allow`` header listing the methods the path accepts.
+
+    Rules are read from the ``HTTP_METHOD_RESTRICTIONS`` setting, a dict mapping a
+    path prefix to the list of methods restricted under it, or to a dict whose
+    ``allow`` entry lists the only methods accepted. When several prefixes match, all
+    their rules apply, so a rule on a nested prefix can only restrict further. A
+    method no rule denies or leaves out of its ``allow`` list is let through, even a
+    non-standard one. The rules are compiled into a prefix trie at startup, so
+    matching does not slow down as rules are added.
     """
-    
+
     def __init__(self, get_response):
         """
-        Initialize the middleware with the given get_response callable and set restricted paths.
-        
+        Initialize the middleware with the given get_response callable and compile the restricted paths.
+
         Parameters
         ----------
         get_response : callable
             The next middleware or view in the chain.
         """
-        self.get_response = get_response
+        super().__init__(get_response)
         # Define paths and their restricted methods
-        self.restricted_paths = {
+        self.restricted_paths = getattr(settings, 'HTTP_METHOD_RESTRICTIONS', None) or {
             '/admin/sensitive-endpoint/': ['POST', 'DELETE'],
         }
+        self.rules = PathPrefixTrie(
+            (path, MethodRule.from_setting(methods)) for path, methods in self.restricted_paths.items()
+        )
+
+    def check_method(self, request):
+        """
+        Check the request method against the rules of every matching prefix.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
 
-    def __call__(self, request):
+        Returns
+        -------
+        HttpResponseNotAllowed or None
+            A 405 response if the method is restricted, otherwise None.
         """
-        Handle the incoming request and restrict HTTP methods for specific paths.
-        
+        rules = list(self.rules.matches(request.path))
+        if all(rule.permits(request.method) for rule in rules):
+            return None
+        # The Allow header lists the known methods every matching rule accepts
+        permitted_methods = set(STANDARD_METHODS).union(*(rule.allowed for rule in rules if rule.allowed is not None))
+        for rule in rules:
+            if rule.allowed is not None:
+                permitted_methods &= rule.allowed
+            permitted_methods -= rule.denied
+        return HttpResponseNotAllowed(permitted_methods=sorted(permitted_methods))
+
+    def process_request(self, request):
+        """
+        Restrict HTTP methods for specific paths.
+
         Parameters
         ----------
         request : HttpRequest
             The incoming HTTP request.
-        
+
         Returns
         -------
-        HttpResponse
-            The HTTP response from the next middleware or view, or a 405 response if the method is restricted.
-        """
-        # Check if the request path and method are restricted
-        for path, methods in self.restricted_paths.items():
-            if request.path.startswith(path) and request.method in methods:
-                # Return a 405 Method Not Allowed response if the method is restricted
-                return HttpResponseNotAllowed(permitted_methods=['GET'])
-        # Pass the request to the next middleware or view
-        return self.get_response(request)
\ No newline at end of file
+        HttpResponse or None
+            A 405 response if the method is restricted, otherwise None.
+        """
+        # Return a 405 Method Not Allowed response if the method is restricted
+        return self.check_method(request)
@@ -1,45 +1,334 @@
+import ipaddress
+import logging
+import os
+import threading
+import time
+from bisect import bisect_right
+from django.conf import settings
 from django.http import HttpResponseForbidden
+from middlewares.StructuredLogger import StructuredLogger
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-class IPWhitelistMiddleware:
+
+def parse_ip(value):
+    """
+    Parse an IP address, unwrapping IPv4 addresses mapped into IPv6.
+
+    Parameters
+    ----------
+    value : str
+        The address as found in a header.
+
+    Returns
+    -------
+    IPv4Address or IPv6Address or None
+        The address, or None if the value is not a valid IP address.
+    """
+    try:
+        address = ipaddress.ip_address(value.strip())
+    except ValueError:
+        return None
+    if address.version == 6 and address.ipv4_mapped is not None:
+        return address.ipv4_mapped
+    return address
+
+
+class IPRangeSet:
+    """
+    Immutable set of IPv4 and IPv6 ranges with logarithmic membership tests.
+
+    The ranges are merged into sorted, non-overlapping intervals per IP version, so
+    a lookup is one binary search whatever the number of entries.
+    """
+
+    __slots__ = ('intervals', 'size')
+
+    def __init__(self, entries=()):
+        """
+        Build the set.
+
+        Parameters
+        ----------
+        entries : iterable of str
+            IP addresses or CIDR ranges such as '10.0.0.0/8' or '2001:db8::/32'.
+
+        Raises
+        ------
+        ValueError
+            If an entry is not a valid address or range.
+        """
+        ranges = {4: [], 6: []}
+        for entry in entries:
+            network = ipaddress.ip_network(entry.strip(), strict=False)
+            ranges[network.version].append((int(network.network_address), int(network.broadcast_address)))
+        self.intervals = {}
+        self.size = 0
+        for version, version_ranges in ranges.items():
+            starts, ends = [], []
+            for start, end in sorted(version_ranges):
+                if ends and start <= ends[-1] + 1:
+                    # Overlapping or adjacent: extend the previous interval
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            self.intervals[version] = (starts, ends)
+            self.size += len(starts)
+
+    def __contains__(self, address):
+        starts, ends = self.intervals[address.version]
+        value = int(address)
+        index = bisect_right(starts, value) - 1
+        return index >= 0 and value <= ends[index]
+
+    def __len__(self):
+        return self.size
+
+    def get(self):
+        """
+        Get the current set, for symmetry with ``ReloadingIPRangeSet``.
+
+        Returns
+        -------
+        IPRangeSet
+            This set.
+        """
+        return self
+
+    @classmethod
+    def from_file(cls, path, extra_entries=()):
+        """
+        Build the set from a file with one address or range per line.
+
+        Blank lines and text after '#' are ignored.
+
+        Parameters
+        ----------
+        path : str
+            The path of the file.
+        extra_entries : iterable of str, optional
+            Entries added to those of the file.
+
+        Returns
+        -------
+        IPRangeSet
+            The set of the file's and the extra entries.
+        """
+        with open(path) as file:
+            entries = [line.split('#', 1)[0].strip() for line in file]
+        return cls([entry for entry in entries if entry] + list(extra_entries))
+
+
+class ReloadingIPRangeSet:
+    """
+    IP range set backed by a file and rebuilt when the file changes.
+
+    The file's modification time is checked at most once per ``check_interval``
+    seconds, by whichever request comes first; the others keep using the current set.
+    If the new file cannot be parsed the previous set stays in use.
+    """
+
+    def __init__(self, path, extra_entries=(), check_interval=5, logger=None):
+        """
+        Load the file.
+
+        Parameters
+        ----------
+        path : str
+            The path of the file.
+        extra_entries : iterable of str, optional
+            Entries from settings added to those of the file.
+        check_interval : float, optional
+            Seconds between checks of the file's modification time.
+        logger : StructuredLogger, optional
+            Logger reload failures are reported to.
+        """
+        self.path = path
+        self.extra_entries = tuple(extra_entries)
+        self.check_interval = check_interval
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.mtime = os.stat(path).st_mtime_ns
+        self.ranges = IPRangeSet.from_file(path, self.extra_entries)
+        self.next_check = time.monotonic() + check_interval
+
+    def get(self):
+        """
+        Get the current set, reloading the file first if it changed.
+
+        Returns
+        -------
+        IPRangeSet
+            The current set.
+        """
+        if time.monotonic() >= self.next_check and self.lock.acquire(blocking=False):
+            try:
+                self.next_check = time.monotonic() + self.check_interval
+                self.reload()
+            finally:
+                self.lock.release()
+        return self.ranges
+
+    def reload(self, force=False):
+        """
+        Rebuild the set from the file if its modification time changed.
+
+        Parameters
+        ----------
+        force : bool, optional
+            Rebuild even if the file looks unchanged.
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if force or mtime != self.mtime:
+                self.ranges = IPRangeSet.from_file(self.path, self.extra_entries)
+                self.mtime = mtime
+        except (OSError, ValueError) as e:
+            if self.logger is not None:
+                self.logger.log('ip_list_reload_failed', level=logging.ERROR, path=self.path, error=str(e))
+
+
+class IPWhitelistMiddleware(AsyncMiddlewareMixin):
     """
     Middleware to restrict access based on IP address.
-    
-    This middleware allows access only to requests coming from whitelisted IP addresses.
-    All other requests will receive a 403 Forbidden response.
+
+    This middleware allows access only to requests coming from whitelisted IP addresses
+    or ranges. All other requests will receive a 403 Forbidden response. Lists of any
+    size are matched with one binary search per IP version.
+
+    Settings
+    --------
+    IP_WHITELIST : iterable of str
+        Allowed addresses and CIDR ranges (default 127.0.0.1 and 192.168.1.1). An
+        empty list with a denylist allows every address that is not denied.
+    IP_WHITELIST_FILE : str
+        File with more allowed entries, one per line, reloaded when it changes.
+    IP_DENYLIST, IP_DENYLIST_FILE
+        Denied addresses and ranges, checked before the allowlist.
+    IP_LIST_RELOAD_INTERVAL : float
+        Seconds between checks of the files for changes (default 5).
+    TRUSTED_PROXIES : iterable of str
+        Addresses and ranges of the load balancers and proxies in front of the site.
+        When the request comes from one of them, the client address is the rightmost
+        ``X-Forwarded-For`` entry that is not a trusted proxy.
     """
-    
+
     def __init__(self, get_response):
         """
-        Initialize the middleware with the given get_response callable and set the allowed IPs.
-        
+        Initialize the middleware with the given get_response callable and load the IP lists.
+
         Parameters
         ----------
         get_response : callable
             The next middleware or view in the chain.
         """
-        self.get_response = get_response
-        self.allowed_ips = ['127.0.0.1', '192.168.1.1']  # Add allowed IPs here
+        super().__init__(get_response)
+        self.logger = StructuredLogger(__name__, 'IPWhitelistMiddleware')
+        reload_interval = getattr(settings, 'IP_LIST_RELOAD_INTERVAL', 5)
+        self.allowed_ips = self.load_list(
+            getattr(settings, 'IP_WHITELIST', ['127.0.0.1', '192.168.1.1']),
+            getattr(settings, 'IP_WHITELIST_FILE', None),
+            reload_interval,
+        )
+        self.denied_ips = self.load_list(
+            getattr(settings, 'IP_DENYLIST', ()),
+            getattr(settings, 'IP_DENYLIST_FILE', None),
+            reload_interval,
+        )
+        self.trusted_proxies = IPRangeSet(getattr(settings, 'TRUSTED_PROXIES', ()))
+
+    def load_list(self, entries, path, reload_interval):
+        """
+        Build an IP list from settings entries and an optional file.
+
+        Parameters
+        ----------
+        entries : iterable of str
+            Addresses and ranges from settings.
+        path : str or None
+            File with more entries, reloaded when it changes.
+        reload_interval : float
+            Seconds between checks of the file for changes.
+
+        Returns
+        -------
+        IPRangeSet or ReloadingIPRangeSet
+            The list, static when there is no file.
+        """
+        if path:
+            return ReloadingIPRangeSet(path, entries, reload_interval, self.logger)
+        return IPRangeSet(entries)
 
-    def __call__(self, request):
+    def get_client_ip(self, request):
         """
-        Handle the incoming request and check if the IP address is allowed.
-        
+        Get the address of the client, looking through trusted proxies.
+
         Parameters
         ----------
         request : HttpRequest
             The incoming HTTP request.
-        
+
+        Returns
+        -------
+        IPv4Address or IPv6Address or None
+            The client address, or None if it is missing or malformed.
+        """
+        address = parse_ip(request.META.get('REMOTE_ADDR', ''))
+        if address is None or address not in self.trusted_proxies:
+            return address
+        forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+        if not forwarded_for:
+            return address
+        # Each proxy appends the address it received the request from, so read from
+        # the right and stop at the first hop that is not one of ours
+        for hop in reversed(forwarded_for.split(',')):
+            address = parse_ip(hop)
+            if address is None or address not in self.trusted_proxies:
+                return address
+        return address
+
+    def is_allowed(self, request):
+        """
+        Check the client address against the deny and allow lists.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+
         Returns
         -------
-        HttpResponse
-            The HTTP response from the next middleware or view if the IP is allowed,
-            otherwise a 403 Forbidden response.
-        """
-        # Get the IP address of the request
-        ip = request.META.get('REMOTE_ADDR')
-        # Check if the IP address is in the allowed list
-        if ip not in self.allowed_ips:
+        bool
+            True if the request may proceed.
+        """
+        address = self.get_client_ip(request)
+        if address is None:
+            return False
+        denied_ips = self.denied_ips.get()
+        if address in denied_ips:
+            return False
+        allowed_ips = self.allowed_ips.get()
+        # An empty allowlist next to a denylist only blocks the denied addresses
+        if not allowed_ips and denied_ips:
+            return True
+        return address in allowed_ips
+
+    def process_request(self, request):
+        """
+        Check if the IP address is allowed.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        HttpResponse or None
+            A 403 Forbidden response if the IP is not allowed, otherwise None.
+        """
+        if not self.is_allowed(request):
             # Return a 403 Forbidden response if the IP is not allowed
             return HttpResponseForbidden("Forbidden")
         # Pass the request to the next middleware or view
-        return self.get_response(request)
\ No newline at end of file
+        return None
@@ -1,45 +1,50 @@
 from django.utils import translation
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-class LanguageSwitcherMiddleware:
+class LanguageSwitcherMiddleware(AsyncMiddlewareMixin):
     """
     Middleware to switch the language based on the request parameter.
     
     This middleware allows switching the language of the application based on
     a 'lang' parameter in the request's query string.
     """
-    
-    def __init__(self, get_response):
+
+    def process_request(self, request):
         """
-        Initialize the middleware with the given get_response callable.
-        
+        Switch the language if the 'lang' parameter is present.
+
         Parameters
         ----------
-        get_response : callable
-            The next middleware or view in the chain.
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        None
+            The request is always passed on to the next middleware or view.
         """
-        self.get_response = get_response
+        # Get the language code from the query parameters
+        lang_code = request.GET.get('lang')
+        if lang_code:
+            # Activate the specified language
+            translation.activate(lang_code)
+        return None
 
-    def __call__(self, request):
+    def process_response(self, request, response):
         """
-        Handle the incoming request and switch the language if the 'lang' parameter is present.
-        
+        Deactivate the language after the response is generated.
+
         Parameters
         ----------
         request : HttpRequest
             The incoming HTTP request.
-        
+        response : HttpResponse
+            The HTTP response from the next middleware or view.
+
         Returns
         -------
         HttpResponse
             The HTTP response from the next middleware or view.
         """
-        # Get the language code from the query parameters
-        lang_code = request.GET.get('lang')
-        if lang_code:
-            # Activate the specified language
-            translation.activate(lang_code)
-        # Get the response from the next middleware or view
-        response = self.get_response(request)
-        # Deactivate the language after the response is generated
         translation.deactivate()
         return response
\ No newline at end of file
@@ -1,44 +1,49 @@
 from django.utils import translation
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-class LocaleMiddleware:
+class LocaleMiddleware(AsyncMiddlewareMixin):
     """
     Middleware to set the locale based on a cookie.
     
     This middleware sets the locale for the current request based on the 'user_locale'
     cookie. If the cookie is not present, it defaults to 'en' (English).
     """
-    
-    def __init__(self, get_response):
+
+    def process_request(self, request):
         """
-        Initialize the middleware with the given get_response callable.
-        
+        Set the locale based on the 'user_locale' cookie.
+
         Parameters
         ----------
-        get_response : callable
-            The next middleware or view in the chain.
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        None
+            The request is always passed on to the next middleware or view.
         """
-        self.get_response = get_response
+        # Get the locale from the 'user_locale' cookie, default to 'en' if not present
+        user_locale = request.COOKIES.get('user_locale', 'en')
+        # Activate the specified locale
+        translation.activate(user_locale)
+        return None
 
-    def __call__(self, request):
+    def process_response(self, request, response):
         """
-        Handle the incoming request and set the locale based on the 'user_locale' cookie.
-        
+        Deactivate the locale after the response is generated.
+
         Parameters
         ----------
         request : HttpRequest
             The incoming HTTP request.
-        
+        response : HttpResponse
+            The HTTP response from the next middleware or view.
+
         Returns
         -------
         HttpResponse
             The HTTP response from the next middleware or view.
         """
-        # Get the locale from the 'user_locale' cookie, default to 'en' if not present
-        user_locale = request.COOKIES.get('user_locale', 'en')
-        # Activate the specified locale
-        translation.activate(user_locale)
-        # Get the response from the next middleware or view
-        response = self.get_response(request)
-        # Deactivate the locale after the response is generated
         translation.deactivate()
         return response
\ No newline at end of file
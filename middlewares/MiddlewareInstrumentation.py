@@ -0,0 +1,250 @@
+import re
+import threading
+import time
+import tracemalloc
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.module_loading import import_string
+from middlewares.RequestTimingMiddleware import RequestTimingMiddleware
+
+# Prefix of the generated attribute names that resolve to instrumented middlewares
+INSTRUMENTED_PREFIX = 'Instrumented__'
+# Escapes of dotted paths in generated attribute names: '_' is written '__' and '.' '_d'
+PATH_ESCAPES = {'_': '__', '.': '_d'}
+PATH_ESCAPE_PATTERN = re.compile(r'_([_d])')
+# Hooks Django calls on a middleware instance that defines them
+MIDDLEWARE_HOOKS = ('process_view', 'process_exception', 'process_template_response')
+
+# Aggregated statistics of the process by middleware name
+_stats = {}
+_stats_lock = threading.Lock()
+# Instrumented classes built from dotted paths, by attribute name
+_instrumented_classes = {}
+
+
+class MiddlewareStats:
+    """
+    Aggregated self-time and allocation statistics of one middleware.
+    """
+
+    __slots__ = ('calls', 'total_ns', 'max_ns', 'total_bytes', 'lock')
+
+    def __init__(self):
+        self.calls = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def record(self, self_ns, self_bytes):
+        """
+        Record the self-time and net allocations of one call.
+
+        Parameters
+        ----------
+        self_ns : int
+            Time spent in the middleware itself, in nanoseconds.
+        self_bytes : int
+            Net bytes allocated by the middleware itself, 0 if not traced.
+        """
+        with self.lock:
+            self.calls += 1
+            self.total_ns += self_ns
+            self.total_bytes += self_bytes
+            if self_ns > self.max_ns:
+                self.max_ns = self_ns
+
+
+def get_stats(name):
+    """
+    Get the statistics of a middleware, creating them on first use.
+
+    Parameters
+    ----------
+    name : str
+        The middleware name.
+
+    Returns
+    -------
+    MiddlewareStats
+        The statistics of the middleware.
+    """
+    with _stats_lock:
+        return _stats.setdefault(name, MiddlewareStats())
+
+
+def get_middleware_report():
+    """
+    Summarize the self-time and allocations of every instrumented middleware.
+
+    Returns
+    -------
+    list of dict
+        One entry per middleware, costliest total self-time first, with the number
+        of calls, the total, mean and max self-time in milliseconds and the mean net
+        bytes allocated per call.
+    """
+    report = []
+    for name, stats in list(_stats.items()):
+        with stats.lock:
+            calls = stats.calls or 1
+            report.append({
+                'middleware': name,
+                'calls': stats.calls,
+                'total_ms': stats.total_ns / 1e6,
+                'mean_ms': stats.total_ns / calls / 1e6,
+                'max_ms': stats.max_ns / 1e6,
+                'mean_bytes': stats.total_bytes / calls,
+            })
+    return sorted(report, key=lambda entry: entry['total_ms'], reverse=True)
+
+
+def instrument(middleware_class):
+    """
+    Wrap a middleware class so its self-time and allocations are measured.
+
+    The wrapper passes the middleware a timed ``get_response``, so the time spent in
+    downstream middlewares and the view is subtracted from the middleware's own.
+    Each call is recorded in the middleware's statistics and added to the response as
+    a ``Server-Timing`` entry. Net allocations are measured with tracemalloc when the
+    ``MIDDLEWARE_INSTRUMENTATION_TRACE_ALLOCATIONS`` setting is True; tracemalloc
+    counts the whole process, so the figures are only exact with a single thread.
+    Work done while a streaming response is consumed is not included. In async mode
+    self-time is wall time, so it also counts time the event loop spent on other
+    requests while the middleware awaited something other than the next handler.
+    The ``process_view``, ``process_exception`` and ``process_template_response``
+    hooks of the middleware are forwarded unchanged and not measured.
+
+    Parameters
+    ----------
+    middleware_class : type
+        The middleware class to wrap.
+
+    Returns
+    -------
+    type
+        The instrumented middleware class.
+    """
+    name = middleware_class.__name__
+
+    class InstrumentedMiddleware:
+        # Let Django adapt the chain exactly as it would for the wrapped class
+        sync_capable = getattr(middleware_class, 'sync_capable', True)
+        async_capable = getattr(middleware_class, 'async_capable', False)
+
+        def __init__(self, get_response):
+            self.get_response = get_response
+            self.async_mode = iscoroutinefunction(get_response)
+            if self.async_mode:
+                markcoroutinefunction(self)
+            self.stats = get_stats(name)
+            self.trace_allocations = getattr(settings, 'MIDDLEWARE_INSTRUMENTATION_TRACE_ALLOCATIONS', False)
+            if self.trace_allocations and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            # Time and bytes spent downstream during the current call
+            self.downstream = ContextVar(f'{name}_downstream')
+            self.middleware = middleware_class(self.atimed_get_response if self.async_mode else self.timed_get_response)
+            # Django looks the hooks up on the instance, so only expose those defined
+            for hook in MIDDLEWARE_HOOKS:
+                if hasattr(self.middleware, hook):
+                    setattr(self, hook, getattr(self.middleware, hook))
+
+        def traced_memory(self):
+            return tracemalloc.get_traced_memory()[0] if self.trace_allocations else 0
+
+        def timed_get_response(self, request):
+            start_time = time.perf_counter_ns()
+            start_memory = self.traced_memory()
+            try:
+                return self.get_response(request)
+            finally:
+                downstream = self.downstream.get(None)
+                if downstream is not None:
+                    downstream[0] += time.perf_counter_ns() - start_time
+                    downstream[1] += self.traced_memory() - start_memory
+
+        async def atimed_get_response(self, request):
+            start_time = time.perf_counter_ns()
+            start_memory = self.traced_memory()
+            try:
+                return await self.get_response(request)
+            finally:
+                downstream = self.downstream.get(None)
+                if downstream is not None:
+                    downstream[0] += time.perf_counter_ns() - start_time
+                    downstream[1] += self.traced_memory() - start_memory
+
+        def __call__(self, request):
+            if self.async_mode:
+                return self.__acall__(request)
+            token = self.downstream.set([0, 0])
+            start_time = time.perf_counter_ns()
+            start_memory = self.traced_memory()
+            try:
+                response = self.middleware(request)
+            finally:
+                self_ns = self.record(token, start_time, start_memory)
+            RequestTimingMiddleware.add_server_timing(response, name, self_ns / 1e6)
+            return response
+
+        async def __acall__(self, request):
+            token = self.downstream.set([0, 0])
+            start_time = time.perf_counter_ns()
+            start_memory = self.traced_memory()
+            try:
+                response = await self.middleware(request)
+            finally:
+                self_ns = self.record(token, start_time, start_memory)
+            RequestTimingMiddleware.add_server_timing(response, name, self_ns / 1e6)
+            return response
+
+        def record(self, token, start_time, start_memory):
+            downstream_ns, downstream_bytes = self.downstream.get()
+            self_ns = time.perf_counter_ns() - start_time - downstream_ns
+            self_bytes = self.traced_memory() - start_memory - downstream_bytes
+            self.downstream.reset(token)
+            self.stats.record(self_ns, self_bytes)
+            return self_ns
+
+    InstrumentedMiddleware.__name__ = InstrumentedMiddleware.__qualname__ = f'Instrumented{name}'
+    return InstrumentedMiddleware
+
+
+def instrument_middleware_paths(paths):
+    """
+    Turn a ``MIDDLEWARE`` list into one whose entries load instrumented classes.
+
+    Nothing is imported here, so it is safe to call from the settings module::
+
+        MIDDLEWARE = instrument_middleware_paths([...])
+
+    Parameters
+    ----------
+    paths : iterable of str
+        Dotted paths of middleware classes.
+
+    Returns
+    -------
+    list of str
+        Dotted paths of the instrumented classes, resolved by this module on import.
+    """
+    return [
+        f"{__name__}.{INSTRUMENTED_PREFIX}{''.join(PATH_ESCAPES.get(char, char) for char in path)}"
+        for path in paths
+    ]
+
+
+def __getattr__(attribute):
+    """
+    Resolve the generated names of ``instrument_middleware_paths`` to instrumented classes.
+    """
+    if not attribute.startswith(INSTRUMENTED_PREFIX):
+        raise AttributeError(f'module {__name__!r} has no attribute {attribute!r}')
+    instrumented_class = _instrumented_classes.get(attribute)
+    if instrumented_class is None:
+        path = PATH_ESCAPE_PATTERN.sub(
+            lambda match: '_' if match.group(1) == '_' else '.', attribute[len(INSTRUMENTED_PREFIX):],
+        )
+        instrumented_class = _instrumented_classes[attribute] = instrument(import_string(path))
+    return instrumented_class
\ No newline at end of file
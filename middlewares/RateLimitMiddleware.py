@@ -1,55 +1,633 @@
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
 from django.http import HttpResponse
+from django.utils.module_loading import import_string
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-class RateLimitMiddleware:
+# Lua script for a fixed window counter: increment and set the expiry only on the first hit
+FIXED_WINDOW_SCRIPT = """
+local count = redis.call('INCR', KEYS[1])
+if count == 1 then
+    redis.call('PEXPIRE', KEYS[1], ARGV[1])
+end
+return count
+"""
+
+# Lua script for a sliding window log: drop old entries, count the rest and record the hit if allowed
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window)
+local count = redis.call('ZCARD', KEYS[1])
+if count >= limit then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now, ARGV[4])
+redis.call('PEXPIRE', KEYS[1], window)
+return 1
+"""
+
+# Lua script for a token bucket: refill by elapsed time, then take one token if available
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local refill_rate = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * refill_rate / 1000)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], ttl)
+return allowed
+"""
+
+
+def get_redis_client(cache_backend):
+    """
+    Return the raw Redis client behind a Django cache backend, if there is one.
+
+    Both Django's built-in ``RedisCache`` and ``django-redis`` are supported. Any other
+    backend returns None and the limiters fall back to the generic cache API.
+
+    Parameters
+    ----------
+    cache_backend : BaseCache
+        The Django cache backend.
+
+    Returns
+    -------
+    redis.Redis or None
+        The Redis client used for writes, or None if the backend is not Redis.
+    """
+    # django-redis exposes its client wrapper as 'client'
+    client = getattr(cache_backend, 'client', None)
+    if client is not None and hasattr(client, 'get_client'):
+        return client.get_client(write=True)
+    # django.core.cache.backends.redis.RedisCache keeps it in '_cache'
+    client = getattr(cache_backend, '_cache', None)
+    if client is not None and hasattr(client, 'get_client'):
+        return client.get_client(write=True)
+    return None
+
+
+class RateLimiter:
+    """
+    Base class for rate limiter engines.
+
+    A limiter decides whether one more request is allowed for a given key. Subclasses
+    implement ``hit`` with a single atomic backend operation per request, using a Lua
+    script when the cache is Redis and the generic cache API otherwise. Limiters whose
+    state cannot be updated atomically through the generic cache API set
+    ``requires_redis`` and refuse any other backend.
+    """
+
+    # Lua source run on Redis backends, set by subclasses
+    script = None
+    # Whether the limiter only works with its Lua script
+    requires_redis = False
+
+    def __init__(self, rate, period, cache_backend=cache):
+        """
+        Initialize the limiter.
+
+        Parameters
+        ----------
+        rate : int
+            The maximum number of requests allowed per period.
+        period : int
+            The length of the period in seconds.
+        cache_backend : BaseCache, optional
+            The Django cache backend used to store the counters.
+
+        Raises
+        ------
+        ImproperlyConfigured
+            If the limiter requires Redis and the cache backend is not Redis.
+        """
+        self.rate = rate
+        self.period = period
+        self.cache = cache_backend
+        self.redis_client = get_redis_client(cache_backend)
+        # Register the script once so each request only sends EVALSHA
+        self.redis_script = self.redis_client.register_script(self.script) if self.redis_client and self.script else None
+        if self.requires_redis and self.redis_script is None:
+            raise ImproperlyConfigured(f'{type(self).__name__} requires a Redis cache backend.')
+
+    def hit(self, key):
+        """
+        Record a request for the given key.
+
+        Parameters
+        ----------
+        key : str
+            The cache key identifying the client being limited.
+
+        Returns
+        -------
+        bool
+            True if the request is allowed, False if the limit is exceeded.
+        """
+        raise NotImplementedError
+
+    async def ahit(self, key):
+        """
+        Record a request for the given key without blocking the event loop.
+
+        By default ``hit`` runs in a worker thread; subclasses override this when they
+        can avoid the thread hop. Django's async cache methods are no substitute: on
+        most backends ``aincr`` is a separate get and set, so concurrent requests
+        would lose increments.
+
+        Parameters
+        ----------
+        key : str
+            The cache key identifying the client being limited.
+
+        Returns
+        -------
+        bool
+            True if the request is allowed, False if the limit is exceeded.
+        """
+        # Limiters share no thread-local state, so any worker thread will do
+        return await sync_to_async(self.hit, thread_sensitive=False)(key)
+
+
+class FixedWindowLimiter(RateLimiter):
+    """
+    Rate limiter that counts requests in fixed, aligned windows.
+
+    Each window gets its own key with an expiry set only when the key is created, so
+    the window always ends on time no matter how often the client keeps sending requests.
+    """
+
+    script = FIXED_WINDOW_SCRIPT
+
+    def hit(self, key):
+        """
+        Count a request in the current window with one atomic increment.
+
+        Parameters
+        ----------
+        key : str
+            The cache key identifying the client being limited.
+
+        Returns
+        -------
+        bool
+            True if the request is allowed, False if the limit is exceeded.
+        """
+        # Suffix the key with the index of the current window
+        window_key = f'{key}_{int(time.time() // self.period)}'
+        if self.redis_script is not None:
+            count = self.redis_script(keys=[self.cache.make_key(window_key)], args=[self.period * 1000])
+            return count <= self.rate
+        try:
+            # Most requests hit an existing window, which costs a single atomic increment
+            count = self.cache.incr(window_key)
+        except ValueError:
+            # First request in the window: create the key, retrying the increment if another worker won
+            if self.cache.add(window_key, 1, self.period):
+                count = 1
+            else:
+                count = self.cache.incr(window_key)
+        return count <= self.rate
+
+
+class SlidingWindowLogLimiter(RateLimiter):
+    """
+    Rate limiter that keeps a log of request timestamps over a sliding window.
+
+    The log is a Redis sorted set updated by one script call, which only records
+    allowed requests, so a client retrying while limited is admitted again as soon as
+    its oldest request leaves the window. Other backends cannot store or trim a log
+    atomically, so they are refused.
+    """
+
+    script = SLIDING_WINDOW_SCRIPT
+    requires_redis = True
+
+    def hit(self, key):
+        """
+        Trim the log, then record the request if fewer than ``rate`` remain in it.
+
+        Parameters
+        ----------
+        key : str
+            The cache key identifying the client being limited.
+
+        Returns
+        -------
+        bool
+            True if the request is allowed, False if the limit is exceeded.
+        """
+        now_ms = int(time.time() * 1000)
+        # The member only has to be unique, the score carries the timestamp
+        member = f'{now_ms}-{time.perf_counter_ns()}'
+        allowed = self.redis_script(
+            keys=[self.cache.make_key(key)],
+            args=[now_ms, self.period * 1000, self.rate, member],
+        )
+        return bool(allowed)
+
+
+class TokenBucketLimiter(RateLimiter):
+    """
+    Rate limiter that refills a bucket of ``rate`` tokens evenly over ``period`` seconds.
+
+    Bursts up to the bucket size are allowed, after which requests are admitted at the
+    refill rate. The refill and take happen in one Redis script call; other backends
+    could only read and write the bucket without a lock, losing updates between
+    workers, so they are refused.
+    """
+
+    script = TOKEN_BUCKET_SCRIPT
+    requires_redis = True
+
+    def hit(self, key):
+        """
+        Refill the bucket for the time elapsed and take a token if one is left.
+
+        Parameters
+        ----------
+        key : str
+            The cache key identifying the client being limited.
+
+        Returns
+        -------
+        bool
+            True if the request is allowed, False if the limit is exceeded.
+        """
+        allowed = self.redis_script(
+            keys=[self.cache.make_key(key)],
+            args=[int(time.time() * 1000), self.rate, self.rate / self.period, self.period * 1000],
+        )
+        return bool(allowed)
+
+
+class LocalCounterShard:
+    """
+    One shard of the in-process counters used by ``AggregatedFixedWindowLimiter``.
+
+    Each shard has its own lock so threads counting different clients rarely contend.
+    """
+
+    __slots__ = ('lock', 'window', 'pending', 'known')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Index of the window the counts belong to
+        self.window = None
+        # Requests counted locally and not yet pushed to the shared cache
+        self.pending = {}
+        # Shared count of each key as last returned by the cache
+        self.known = {}
+
+
+class AggregatedFixedWindowLimiter(RateLimiter):
+    """
+    Fixed window limiter that counts in-process and pushes counts to the cache in batches.
+
+    Requests are counted in sharded local counters and checked against the last shared
+    count seen for the key plus the local pending count, so most requests make no cache
+    call at all. Every ``flush_interval`` milliseconds the pending counts are pushed with
+    one atomic increment per key (one pipelined round trip on Redis), and the returned
+    totals refresh the shared view.
+
+    Keys whose pending count is below ``rate * error_bound`` are kept local until the
+    window ends and are never written to the cache. This keeps the many clients that
+    only send a handful of requests out of the shared cache entirely, at the cost of
+    letting each worker admit up to that many requests, plus those arriving within one
+    flush interval, beyond the shared limit.
     """
-    Middleware to rate limit incoming requests based on IP address.
-    
+
+    def __init__(self, rate, period, cache_backend=cache, flush_interval=100, error_bound=0.05, shards=16):
+        """
+        Initialize the limiter.
+
+        Parameters
+        ----------
+        rate : int
+            The maximum number of requests allowed per period.
+        period : int
+            The length of the period in seconds.
+        cache_backend : BaseCache, optional
+            The Django cache backend used to store the shared counters.
+        flush_interval : int, optional
+            Milliseconds between pushes of the local counts to the cache.
+        error_bound : float, optional
+            Fraction of the rate a worker may overshoot by before its count is pushed.
+        shards : int, optional
+            Number of independently locked local counter shards.
+        """
+        super().__init__(rate, period, cache_backend)
+        self.flush_interval = flush_interval / 1000
+        self.flush_threshold = max(1, int(rate * error_bound))
+        self.shards = [LocalCounterShard() for _ in range(shards)]
+        self.flush_lock = threading.Lock()
+        self.next_flush = 0
+
+    def hit(self, key):
+        """
+        Count a request locally, pushing the local counts first if a flush is due.
+
+        Parameters
+        ----------
+        key : str
+            The cache key identifying the client being limited.
+
+        Returns
+        -------
+        bool
+            True if the request is allowed, False if the limit is exceeded.
+        """
+        total, window = self.count(key)
+        if time.time() >= self.next_flush:
+            self.flush(window)
+        return total <= self.rate
+
+    async def ahit(self, key):
+        """
+        Async counterpart of ``hit``, flushing in a worker thread when a flush is due.
+
+        Parameters
+        ----------
+        key : str
+            The cache key identifying the client being limited.
+
+        Returns
+        -------
+        bool
+            True if the request is allowed, False if the limit is exceeded.
+        """
+        total, window = self.count(key)
+        if time.time() >= self.next_flush:
+            # Only the flush talks to the cache, so only it leaves the event loop
+            await sync_to_async(self.flush, thread_sensitive=False)(window)
+        return total <= self.rate
+
+    def count(self, key):
+        """
+        Count a request in the local counters.
+
+        Parameters
+        ----------
+        key : str
+            The cache key identifying the client being limited.
+
+        Returns
+        -------
+        tuple
+            The shared count last seen for the key plus the local pending count, and
+            the index of the current window.
+        """
+        window = int(time.time() // self.period)
+        shard = self.shards[hash(key) % len(self.shards)]
+        with shard.lock:
+            if shard.window != window:
+                # A new window started, so the old counts no longer apply
+                shard.window = window
+                shard.pending.clear()
+                shard.known.clear()
+            pending = shard.pending.get(key, 0) + 1
+            shard.pending[key] = pending
+            total = shard.known.get(key, 0) + pending
+        return total, window
+
+    def flush(self, window):
+        """
+        Push the pending local counts of the current window to the shared cache.
+
+        Only one thread flushes at a time; others keep counting locally instead of waiting.
+
+        Parameters
+        ----------
+        window : int
+            The index of the current window.
+        """
+        if not self.flush_lock.acquire(blocking=False):
+            return
+        try:
+            self.next_flush = time.time() + self.flush_interval
+            # Take the counts that are large enough to be worth sharing
+            deltas = {}
+            for shard in self.shards:
+                with shard.lock:
+                    if shard.window != window:
+                        continue
+                    taken = [(key, pending) for key, pending in shard.pending.items() if pending >= self.flush_threshold]
+                    for key, pending in taken:
+                        # Move the count into the shared view until the real total comes back
+                        del shard.pending[key]
+                        shard.known[key] = shard.known.get(key, 0) + pending
+                        deltas[key] = (shard, pending)
+            if not deltas:
+                return
+            totals = self.push({key: pending for key, (_, pending) in deltas.items()}, window)
+            # Replace the optimistic counts with the shared totals
+            for key, total in totals.items():
+                shard = deltas[key][0]
+                with shard.lock:
+                    if shard.window == window:
+                        shard.known[key] = total
+        finally:
+            self.flush_lock.release()
+
+    def push(self, deltas, window):
+        """
+        Add the given counts to the shared window counters.
+
+        Parameters
+        ----------
+        deltas : dict
+            Mapping of key to the number of requests counted locally.
+        window : int
+            The index of the window the counts belong to.
+
+        Returns
+        -------
+        dict
+            Mapping of key to the shared count after the increment.
+        """
+        window_keys = {key: f'{key}_{window}' for key in deltas}
+        if self.redis_client is not None:
+            # Send every increment and expiry in a single pipelined round trip
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for key, delta in deltas.items():
+                redis_key = self.cache.make_key(window_keys[key])
+                pipeline.incrby(redis_key, delta)
+                pipeline.expire(redis_key, self.period)
+            results = pipeline.execute()
+            return dict(zip(deltas, results[::2]))
+        totals = {}
+        for key, delta in deltas.items():
+            try:
+                totals[key] = self.cache.incr(window_keys[key], delta)
+            except ValueError:
+                if self.cache.add(window_keys[key], delta, self.period):
+                    totals[key] = delta
+                else:
+                    totals[key] = self.cache.incr(window_keys[key], delta)
+        return totals
+
+
+# Limiter engines available by name in RATE_LIMIT_RULES
+LIMITER_ENGINES = {
+    'fixed_window': FixedWindowLimiter,
+    'sliding_window': SlidingWindowLogLimiter,
+    'token_bucket': TokenBucketLimiter,
+    'aggregated_fixed_window': AggregatedFixedWindowLimiter,
+}
+
+
+class RateLimitMiddleware(AsyncMiddlewareMixin):
+    """
+    Middleware to rate limit incoming requests per IP address, user or route.
+
     This middleware limits the number of requests a client can make within a specified
     time frame. If the limit is exceeded, a 429 Too Many Requests response is returned.
+
+    Rules are read from the ``RATE_LIMIT_RULES`` setting, a list of dicts checked in
+    order; the first rule whose ``path`` prefix matches the request applies. Each rule
+    accepts:
+
+    - ``path``: URL prefix the rule applies to (default ``'/'``).
+    - ``scope``: ``'ip'``, ``'user'`` (falls back to the IP for anonymous users) or
+      ``'route'`` (one shared limit for everyone on the prefix).
+    - ``algorithm``: ``'fixed_window'``, ``'sliding_window'``, ``'token_bucket'`` or the
+      dotted path of a custom ``RateLimiter`` subclass. ``'sliding_window'`` and
+      ``'token_bucket'`` require a Redis cache backend.
+    - ``rate`` and ``period``: requests allowed per period in seconds.
+    - ``options``: extra keyword arguments for the limiter, such as ``flush_interval``
+      and ``error_bound`` for ``'aggregated_fixed_window'``, the in-process counting mode
+      meant for floods of distinct client IPs.
+
+    Without the setting, every path is limited to 100 requests per 60 seconds per IP.
     """
-    
+
     def __init__(self, get_response):
         """
         Initialize the middleware with the given get_response callable and set rate limit parameters.
-        
+
         Parameters
         ----------
         get_response : callable
             The next middleware or view in the chain.
         """
-        self.get_response = get_response
+        super().__init__(get_response)
         self.rate_limit = 100  # max requests allowed
         self.time_frame = 60   # time frame in seconds
+        rules = getattr(settings, 'RATE_LIMIT_RULES', None) or [
+            {'path': '/', 'scope': 'ip', 'algorithm': 'fixed_window', 'rate': self.rate_limit, 'period': self.time_frame},
+        ]
+        # Build the limiter for every rule once at startup
+        self.rules = [self.compile_rule(index, rule) for index, rule in enumerate(rules)]
+
+    def compile_rule(self, index, rule):
+        """
+        Turn a rule from settings into a (prefix, scope, name, limiter) tuple.
+
+        Parameters
+        ----------
+        index : int
+            The position of the rule, used to keep cache keys of different rules apart.
+        rule : dict
+            The rule as configured in ``RATE_LIMIT_RULES``.
+
+        Returns
+        -------
+        tuple
+            The path prefix, scope, rule name and limiter instance.
+        """
+        algorithm = rule.get('algorithm', 'fixed_window')
+        engine = LIMITER_ENGINES.get(algorithm) or import_string(algorithm)
+        limiter = engine(rule.get('rate', self.rate_limit), rule.get('period', self.time_frame), **rule.get('options', {}))
+        return rule.get('path', '/'), rule.get('scope', 'ip'), rule.get('name', str(index)), limiter
 
-    def __call__(self, request):
+    def get_identity(self, request, scope, user):
         """
-        Handle the incoming request and apply rate limiting based on the client's IP address.
-        
+        Get the identity a rule counts requests against.
+
         Parameters
         ----------
         request : HttpRequest
             The incoming HTTP request.
-        
+        scope : str
+            The scope of the rule: 'ip', 'user' or 'route'.
+        user : User or None
+            The user making the request, None if authentication is not installed.
+
         Returns
         -------
-        HttpResponse
-            The HTTP response from the next middleware or view, or a 429 response if the rate limit is exceeded.
+        str
+            The identity used in the cache key.
         """
-        # Get the client's IP address
-        ip = request.META.get('REMOTE_ADDR')
-        # Generate a cache key based on the IP address
-        cache_key = f'rate_limit_{ip}'
-        # Get the current request count from the cache
-        request_count = cache.get(cache_key, 0)
+        if scope == 'route':
+            return 'all'
+        if scope == 'user':
+            if user is not None and user.is_authenticated:
+                return f'user_{user.pk}'
+        return f"ip_{request.META.get('REMOTE_ADDR')}"
 
-        # Check if the request count exceeds the rate limit
-        if request_count >= self.rate_limit:
-            # Return a 429 Too Many Requests response
-            return HttpResponse("Too many requests", status=429)
+    def handle(self, request):
+        """
+        Handle the incoming request and apply the first matching rate limit rule.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
 
-        # Increment the request count and set it in the cache with the specified time frame
-        cache.set(cache_key, request_count + 1, self.time_frame)
+        Returns
+        -------
+        HttpResponse
+            The HTTP response from the next middleware or view, or a 429 response if the rate limit is exceeded.
+        """
+        for prefix, scope, name, limiter in self.rules:
+            if request.path.startswith(prefix):
+                user = getattr(request, 'user', None) if scope == 'user' else None
+                # Generate a cache key based on the rule and the client identity
+                cache_key = f'rate_limit_{name}_{self.get_identity(request, scope, user)}'
+                if not limiter.hit(cache_key):
+                    # Return a 429 Too Many Requests response
+                    return HttpResponse("Too many requests", status=429)
+                break
         # Get the response from the next middleware or view
         response = self.get_response(request)
-        return response
\ No newline at end of file
+        return response
+
+    async def ahandle(self, request):
+        """
+        Async counterpart of ``handle``, used when the middleware chain runs under ASGI.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        HttpResponse
+            The HTTP response from the next middleware or view, or a 429 response if the rate limit is exceeded.
+        """
+        for prefix, scope, name, limiter in self.rules:
+            if request.path.startswith(prefix):
+                user = None
+                if scope == 'user' and hasattr(request, 'auser'):
+                    # Load the user without a blocking database call
+                    user = await request.auser()
+                cache_key = f'rate_limit_{name}_{self.get_identity(request, scope, user)}'
+                if not await limiter.ahit(cache_key):
+                    return HttpResponse("Too many requests", status=429)
+                break
+        return await self.get_response(request)
\ No newline at end of file
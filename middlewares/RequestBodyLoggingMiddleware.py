@@ -1,14 +1,210 @@
-import logging
+import json
+import re
+from urllib.parse import parse_qsl, urlencode
+from django.conf import settings
+from middlewares.StructuredLogger import StructuredLogger
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-# Initialize the logger for this module
-logger = logging.getLogger(__name__)
+# Methods whose body is logged
+BODY_METHODS = frozenset(('POST', 'PUT', 'PATCH'))
+# Content types whose body is logged: exact types, prefixes ending in '/' and
+# suffixes starting with '+'; any other body is treated as binary
+DEFAULT_TEXT_CONTENT_TYPES = (
+    'application/json', 'application/x-www-form-urlencoded', 'application/xml', 'text/', '+json', '+xml',
+)
+# Field names whose values are replaced in logged JSON documents and forms
+DEFAULT_REDACTED_FIELDS = ('password', 'token', 'secret', 'api_key', 'authorization', 'csrfmiddlewaretoken')
+REDACTED = '[REDACTED]'
 
-class RequestBodyLoggingMiddleware:
+
+def is_text_content_type(content_type, patterns):
+    """
+    Check whether a content type matches one of the text content type patterns.
+
+    Parameters
+    ----------
+    content_type : str
+        The content type of the request, without parameters.
+    patterns : iterable of str
+        Exact types, prefixes ending in '/' and suffixes starting with '+'.
+
+    Returns
+    -------
+    bool
+        True if the body should be logged.
+    """
+    for pattern in patterns:
+        if pattern.endswith('/'):
+            if content_type.startswith(pattern):
+                return True
+        elif pattern.startswith('+'):
+            if content_type.endswith(pattern):
+                return True
+        elif content_type == pattern:
+            return True
+    return False
+
+
+class BodyCaptureStream:
+    """
+    Wrapper of a request stream that keeps a copy of the first bytes read through it.
+
+    Data is passed on to the reader unchanged, so parsers and upload handlers further
+    down the chain stream the body as usual; at most ``limit`` bytes are kept,
+    whatever the size of the upload. Seeking back, as Django does to size spooled
+    ASGI bodies, does not capture the same bytes twice.
+    """
+
+    def __init__(self, stream, limit):
+        """
+        Wrap the stream.
+
+        Parameters
+        ----------
+        stream : file-like object
+            The request's body stream.
+        limit : int
+            The maximum number of bytes kept.
+        """
+        self.stream = stream
+        self.limit = limit
+        self.buffer = bytearray()
+        self.position = 0
+        # Furthest position read, the size of the body as far as it was consumed
+        self.size = 0
+
+    def capture(self, data):
+        captured = len(self.buffer)
+        if captured < self.limit and self.position <= captured < self.position + len(data):
+            offset = captured - self.position
+            self.buffer += data[offset:offset + self.limit - captured]
+        self.position += len(data)
+        self.size = max(self.size, self.position)
+        return data
+
+    def read(self, *args, **kwargs):
+        return self.capture(self.stream.read(*args, **kwargs))
+
+    def readline(self, *args, **kwargs):
+        return self.capture(self.stream.readline(*args, **kwargs))
+
+    def seek(self, *args, **kwargs):
+        self.position = self.stream.seek(*args, **kwargs)
+        return self.position
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class BodyCapture:
+    """
+    Captured start of a request body, rendered and redacted when the record is written.
+
+    The logger formats records on its writer thread, which calls ``str()`` on this
+    object, so decoding and redaction cost nothing on the request thread.
+    """
+
+    __slots__ = ('content_type', 'data', 'truncated', 'redacted_fields')
+
+    def __init__(self, content_type, data, truncated, redacted_fields):
+        """
+        Store the capture.
+
+        Parameters
+        ----------
+        content_type : str
+            The content type of the request.
+        data : bytes
+            The captured bytes.
+        truncated : bool
+            Whether the body is longer than the capture.
+        redacted_fields : frozenset of str
+            Lowercased field names whose values are redacted.
+        """
+        self.content_type = content_type
+        self.data = data
+        self.truncated = truncated
+        self.redacted_fields = redacted_fields
+
+    def __str__(self):
+        # A capture cut in the middle of a character is decoded as far as it goes
+        text = self.data.decode('utf-8', errors='replace')
+        if self.redacted_fields:
+            if self.content_type == 'application/json' or self.content_type.endswith('+json'):
+                text = self.redact_json(text)
+            elif self.content_type == 'application/x-www-form-urlencoded':
+                text = self.redact_form(text)
+        return f'{text}...' if self.truncated else text
+
+    def redact_json(self, text):
+        """
+        Redact the configured fields of a JSON document, at any depth.
+
+        Parameters
+        ----------
+        text : str
+            The document, possibly truncated.
+
+        Returns
+        -------
+        str
+            The redacted document.
+        """
+        try:
+            return json.dumps(self.redact_value(json.loads(text)))
+        except ValueError:
+            pass
+        # A truncated document cannot be parsed, so redact the values of the fields in place
+        pattern = r'("(?:{})"\s*:\s*)("(?:[^"\\]|\\.)*"?|[^,}}\]\s]*)'.format(
+            '|'.join(re.escape(field) for field in self.redacted_fields)
+        )
+        return re.sub(pattern, rf'\1"{REDACTED}"', text, flags=re.IGNORECASE)
+
+    def redact_value(self, value):
+        if isinstance(value, dict):
+            return {
+                key: REDACTED if key.lower() in self.redacted_fields else self.redact_value(item)
+                for key, item in value.items()
+            }
+        if isinstance(value, list):
+            return [self.redact_value(item) for item in value]
+        return value
+
+    def redact_form(self, text):
+        """
+        Redact the configured keys of an urlencoded form.
+
+        Parameters
+        ----------
+        text : str
+            The form, possibly truncated.
+
+        Returns
+        -------
+        str
+            The redacted form.
+        """
+        pairs = parse_qsl(text, keep_blank_values=True)
+        return urlencode([
+            (key, REDACTED if key.lower() in self.redacted_fields else value) for key, value in pairs
+        ])
+
+
+class RequestBodyLoggingMiddleware(AsyncMiddlewareMixin):
     """
-    Middleware to log the request body for POST and PUT requests.
+    Middleware to log the request body for POST, PUT and PATCH requests.
 
-    This middleware logs the body of incoming HTTP requests if the request method is POST or PUT.
-    It can be useful for debugging purposes to see the data being sent to the server.
+    This middleware logs the body of incoming HTTP requests. It can be useful for
+    debugging purposes to see the data being sent to the server.
+
+    The body is not read by the middleware: the request stream is wrapped so that the
+    first ``REQUEST_BODY_LOG_MAX_BYTES`` bytes (default 4096) are copied as the view,
+    form parser or upload handlers read it, and the record is logged once the response
+    is ready. Memory use stays capped at that size and large uploads keep streaming.
+    Only bodies of the ``REQUEST_BODY_LOG_CONTENT_TYPES`` are captured; for binary
+    ones, such as multipart uploads, only the content type and length are logged.
+    Values of the ``REQUEST_BODY_LOG_REDACTED_FIELDS`` are redacted from JSON
+    documents and urlencoded forms by the log writer thread.
     """
 
     def __init__(self, get_response):
@@ -20,11 +216,91 @@ class RequestBodyLoggingMiddleware:
         get_response : callable
             The next middleware or view in the chain.
         """
-        self.get_response = get_response
+        super().__init__(get_response)
+        self.logger = StructuredLogger(__name__, 'RequestBodyLoggingMiddleware')
+        self.max_bytes = getattr(settings, 'REQUEST_BODY_LOG_MAX_BYTES', 4096)
+        self.text_content_types = tuple(getattr(settings, 'REQUEST_BODY_LOG_CONTENT_TYPES', DEFAULT_TEXT_CONTENT_TYPES))
+        self.redacted_fields = frozenset(
+            field.lower() for field in getattr(settings, 'REQUEST_BODY_LOG_REDACTED_FIELDS', DEFAULT_REDACTED_FIELDS)
+        )
+
+    def start_capture(self, request):
+        """
+        Start capturing the body of the request as it is read.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        BodyCaptureStream or None
+            The wrapped stream, or None if the body is not captured.
+        """
+        if request.method not in BODY_METHODS:
+            return None
+        if not is_text_content_type(request.content_type or '', self.text_content_types):
+            return None
+        if hasattr(request, '_body'):
+            # An earlier middleware already read the whole body
+            capture = BodyCaptureStream(None, self.max_bytes)
+            capture.capture(request._body)
+            return capture
+        capture = request._stream = BodyCaptureStream(request._stream, self.max_bytes)
+        return capture
+
+    def log_body(self, request, capture):
+        """
+        Log the captured body of the request.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+        capture : BodyCaptureStream or None
+            The capture started by ``start_capture``.
+        """
+        if request.method not in BODY_METHODS:
+            return
+        fields = {
+            'path': request.path,
+            'method': request.method,
+            'content_type': request.content_type,
+            'content_length': request.META.get('CONTENT_LENGTH'),
+        }
+        if capture is not None:
+            fields['body'] = BodyCapture(
+                request.content_type, bytes(capture.buffer), capture.size > len(capture.buffer), self.redacted_fields,
+            )
+            fields['body_bytes_read'] = capture.size
+        self.logger.log('request_body', **fields)
+
+    def handle(self, request):
+        """
+        Handle the incoming request and log the request body for POST, PUT and PATCH requests.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        HttpResponse
+            The HTTP response from the next middleware or view.
+        """
+        capture = self.start_capture(request)
+        try:
+            # Call the next middleware or view
+            return self.get_response(request)
+        finally:
+            # The body has been read by now, as far as the view needed it
+            self.log_body(request, capture)
 
-    def __call__(self, request):
+    async def ahandle(self, request):
         """
-        Handle the incoming request and log the request body for POST and PUT requests.
+        Async counterpart of ``handle``, used when the middleware chain runs under ASGI.
 
         Parameters
         ----------
@@ -36,10 +312,8 @@ class RequestBodyLoggingMiddleware:
         HttpResponse
             The HTTP response from the next middleware or view.
         """
-        # Check if the request method is POST or PUT
-        if request.method in ['POST', 'PUT']:
-            # Log the request body
-            logger.info(f'Request body: {request.body}')
-        
-        # Call the next middleware or view
-        return self.get_response(request)
\ No newline at end of file
+        capture = self.start_capture(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            self.log_body(request, capture)
@@ -1,47 +1,441 @@
+import cProfile
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
 import time
-import logging
+from django.conf import settings
+from django.http import JsonResponse
+from middlewares.StructuredLogger import StructuredLogger
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-logger = logging.getLogger(__name__)
+# Linear sub-buckets per power of two, giving a relative error of at most 1/16
+SUB_BUCKETS = 16
+# Durations are recorded in microseconds and capped at 2**37 us, about 38 hours
+MAX_EXPONENT = 37
+BUCKET_COUNT = 2 * SUB_BUCKETS + (MAX_EXPONENT - 5) * SUB_BUCKETS
 
-class RequestTimingMiddleware:
+# Methods tracked separately; anything else shares one key so clients cannot add keys
+KNOWN_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+
+# Held while a request is profiled, so at most one profiler runs in the process
+_profiling_lock = threading.Lock()
+
+
+def bucket_index(value):
+    """
+    Get the index of the log-linear histogram bucket holding a value.
+
+    Values below ``2 * SUB_BUCKETS`` get a bucket each; above that every power of two
+    is split into ``SUB_BUCKETS`` equal buckets.
+
+    Parameters
+    ----------
+    value : int
+        The value, a non-negative integer.
+
+    Returns
+    -------
+    int
+        The bucket index.
+    """
+    if value < 2 * SUB_BUCKETS:
+        return value
+    value = min(value, (1 << MAX_EXPONENT) - 1)
+    shift = value.bit_length() - 5
+    return 2 * SUB_BUCKETS + (shift - 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+
+
+def bucket_upper_bound(index):
+    """
+    Get the largest value that falls in a bucket.
+
+    Parameters
+    ----------
+    index : int
+        The bucket index.
+
+    Returns
+    -------
+    int
+        The upper bound of the bucket.
+    """
+    if index < 2 * SUB_BUCKETS:
+        return index
+    shift = (index - 2 * SUB_BUCKETS) // SUB_BUCKETS + 1
+    mantissa = (index - 2 * SUB_BUCKETS) % SUB_BUCKETS + SUB_BUCKETS
+    return ((mantissa + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """
+    Fixed-size log-linear histogram of request durations in microseconds.
+
+    The histogram always holds ``BUCKET_COUNT`` counters, however many durations are
+    recorded, and percentiles read from it are within 1/16 of the true value.
+    """
+
+    __slots__ = ('counts', 'total', 'max', 'lock')
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.total = 0
+        self.max = 0
+        self.lock = threading.Lock()
+
+    def record(self, duration_us):
+        """
+        Record one duration.
+
+        Parameters
+        ----------
+        duration_us : int
+            The duration in microseconds.
+        """
+        index = bucket_index(duration_us)
+        with self.lock:
+            self.counts[index] += 1
+            self.total += 1
+            if duration_us > self.max:
+                self.max = duration_us
+
+    def percentile(self, fraction):
+        """
+        Get the duration below which the given fraction of recorded durations fall.
+
+        Parameters
+        ----------
+        fraction : float
+            The fraction, e.g. 0.99 for p99.
+
+        Returns
+        -------
+        int
+            The duration in microseconds, 0 if nothing was recorded.
+        """
+        with self.lock:
+            target = fraction * self.total
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if count and seen >= target:
+                    return min(bucket_upper_bound(index), self.max)
+            return self.max
+
+    def summary(self):
+        """
+        Summarize the histogram in milliseconds.
+
+        Returns
+        -------
+        dict
+            The count and the p50, p90, p99 and max durations in milliseconds.
+        """
+        return {
+            'count': self.total,
+            'p50': self.percentile(0.5) / 1000,
+            'p90': self.percentile(0.9) / 1000,
+            'p99': self.percentile(0.99) / 1000,
+            'max': self.max / 1000,
+        }
+
+
+# Histograms of the process by (method, URL name), shared with get_latency_summary
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def get_histogram(method, route):
+    """
+    Get the histogram of a method and route, creating it on first use.
+
+    Parameters
+    ----------
+    method : str
+        The HTTP method.
+    route : str
+        The resolved URL name of the request.
+
+    Returns
+    -------
+    LatencyHistogram
+        The histogram of the method and route.
+    """
+    key = (method if method in KNOWN_METHODS else 'OTHER', route)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(key, LatencyHistogram())
+    return histogram
+
+
+def get_latency_summary():
+    """
+    Get the latency percentiles of every route seen by this process.
+
+    Returns
+    -------
+    dict
+        Mapping of 'METHOD url_name' to the summary of its histogram.
     """
-    Middleware to log the duration of each HTTP request.
-    
-    This middleware logs the time taken to process each HTTP request. It is useful
-    for monitoring the performance of the application.
+    return {f'{method} {route}': histogram.summary() for (method, route), histogram in list(_histograms.items())}
+
+
+class SlowRequestProfiler:
     """
-    
+    Opt-in cProfile sampling that keeps only the profiles of slow requests.
+
+    A fraction of requests, plus every request under the chosen path prefixes, run
+    under cProfile. When such a request turns out slower than the threshold its
+    profile is written as a pstats file to the profile directory, which is rotated
+    to keep only the newest files. Profiles of fast requests are discarded. Only one
+    request is profiled at a time, and none while another profiler, such as one a
+    developer started, is active; sampled requests are then simply not profiled.
+    """
+
+    def __init__(self, rate=0.0, paths=(), threshold_ms=500, directory=None, max_files=100):
+        """
+        Initialize the profiler.
+
+        Parameters
+        ----------
+        rate : float, optional
+            Fraction of requests to profile.
+        paths : iterable of str, optional
+            Path prefixes whose requests are always profiled.
+        threshold_ms : float, optional
+            Duration in milliseconds above which a profile is kept.
+        directory : str, optional
+            Directory the profiles are written to, a temporary directory by default.
+        max_files : int, optional
+            Number of profiles kept in the directory.
+        """
+        self.rate = rate
+        self.paths = tuple(paths)
+        self.threshold_us = threshold_ms * 1000
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 'request-profiles')
+        self.max_files = max_files
+        self.lock = threading.Lock()
+        self.enabled = rate > 0 or bool(self.paths)
+
+    def start(self, request):
+        """
+        Start profiling the request if it is sampled.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        Profile or None
+            The running profiler, or None if the request is not profiled.
+        """
+        if not (request.path.startswith(self.paths) or random.random() < self.rate):
+            return None
+        if not _profiling_lock.acquire(blocking=False):
+            # Another request is being profiled
+            return None
+        if sys.getprofile() is not None:
+            # Enabling would silently replace the profiler already active on this thread
+            _profiling_lock.release()
+            return None
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def stop(self, profiler, request, route, duration_us):
+        """
+        Stop profiling and keep the profile if the request was slow.
+
+        Parameters
+        ----------
+        profiler : Profile
+            The running profiler, as returned by ``start``.
+        request : HttpRequest
+            The incoming HTTP request.
+        route : str
+            The resolved URL name of the request.
+        duration_us : int
+            The duration of the request in microseconds.
+        """
+        try:
+            profiler.disable()
+        finally:
+            _profiling_lock.release()
+        if duration_us < self.threshold_us:
+            return
+        name = re.sub(r'[^A-Za-z0-9_.-]+', '_', route)
+        filename = f'{time.time_ns() // 1000000}_{request.method}_{name}_{duration_us // 1000}ms.prof'
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            profiler.dump_stats(os.path.join(self.directory, filename))
+            self.rotate()
+
+    def rotate(self):
+        """
+        Delete the oldest profiles beyond ``max_files``.
+        """
+        profiles = sorted(entry for entry in os.listdir(self.directory) if entry.endswith('.prof'))
+        # File names start with a timestamp, so they sort oldest first
+        for entry in profiles[:-self.max_files]:
+            try:
+                os.remove(os.path.join(self.directory, entry))
+            except FileNotFoundError:
+                pass
+
+
+class RequestTimingMiddleware(AsyncMiddlewareMixin):
+    """
+    Middleware to record the duration of each HTTP request.
+
+    This middleware records the time taken to process each HTTP request in a
+    fixed-size histogram per resolved URL name and method, adds a ``Server-Timing``
+    header to the response and logs the duration. It is useful for monitoring the
+    performance of the application. Percentiles are available from
+    ``get_latency_summary`` and, if the ``REQUEST_TIMING_METRICS_PATH`` setting is
+    set, as JSON at that path.
+
+    Slow requests can be profiled by setting ``REQUEST_PROFILING_RATE`` (fraction of
+    requests) or ``REQUEST_PROFILING_PATHS`` (path prefixes); profiles of requests
+    slower than ``REQUEST_PROFILING_THRESHOLD_MS`` are written to
+    ``REQUEST_PROFILING_DIR``, keeping the newest ``REQUEST_PROFILING_MAX_FILES``.
+    Profiling is skipped in async mode, where cProfile would also measure the other
+    requests sharing the event loop.
+    """
+
     def __init__(self, get_response):
         """
         Initialize the middleware with the given get_response callable.
-        
+
         Parameters
         ----------
         get_response : callable
             The next middleware or view in the chain.
         """
-        self.get_response = get_response
+        super().__init__(get_response)
+        self.logger = StructuredLogger(__name__, 'RequestTimingMiddleware')
+        self.metrics_path = getattr(settings, 'REQUEST_TIMING_METRICS_PATH', None)
+        self.profiler = SlowRequestProfiler(
+            rate=getattr(settings, 'REQUEST_PROFILING_RATE', 0.0),
+            paths=getattr(settings, 'REQUEST_PROFILING_PATHS', ()),
+            threshold_ms=getattr(settings, 'REQUEST_PROFILING_THRESHOLD_MS', 500),
+            directory=getattr(settings, 'REQUEST_PROFILING_DIR', None),
+            max_files=getattr(settings, 'REQUEST_PROFILING_MAX_FILES', 100),
+        )
 
-    def __call__(self, request):
+    def handle(self, request):
         """
-        Handle the incoming request and log the duration of the request processing.
-        
+        Handle the incoming request and record the duration of the request processing.
+
         Parameters
         ----------
         request : HttpRequest
             The incoming HTTP request.
-        
+
         Returns
         -------
         HttpResponse
             The HTTP response from the next middleware or view.
         """
+        if self.metrics_path is not None and request.path == self.metrics_path:
+            return JsonResponse(get_latency_summary())
+        profiler = self.profiler.start(request) if self.profiler.enabled else None
         # Record the start time of the request
-        start_time = time.time()
-        # Get the response from the next middleware or view
-        response = self.get_response(request)
-        # Calculate the duration of the request processing
-        duration = time.time() - start_time
+        start_time = time.perf_counter_ns()
+        try:
+            # Get the response from the next middleware or view
+            response = self.get_response(request)
+        finally:
+            # Calculate the duration of the request processing
+            duration_us = (time.perf_counter_ns() - start_time) // 1000
+            route = self.get_route(request)
+            if profiler is not None:
+                self.profiler.stop(profiler, request, route, duration_us)
+        self.record(request, response, route, duration_us)
+        return response
+
+    async def ahandle(self, request):
+        """
+        Async counterpart of ``handle``, used when the middleware chain runs under ASGI.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        HttpResponse
+            The HTTP response from the next middleware or view.
+        """
+        if self.metrics_path is not None and request.path == self.metrics_path:
+            return JsonResponse(get_latency_summary())
+        start_time = time.perf_counter_ns()
+        try:
+            response = await self.get_response(request)
+        finally:
+            duration_us = (time.perf_counter_ns() - start_time) // 1000
+        self.record(request, response, self.get_route(request), duration_us)
+        return response
+
+    @staticmethod
+    def get_route(request):
+        """
+        Get the name the request's duration is grouped under.
+
+        Grouping by URL name lets paths with different arguments share a histogram.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        str
+            The resolved view name, or '<unresolved>' if the URL did not resolve.
+        """
+        resolver_match = getattr(request, 'resolver_match', None)
+        return resolver_match.view_name if resolver_match is not None else '<unresolved>'
+
+    def record(self, request, response, route, duration_us):
+        """
+        Record the duration in the route's histogram, the response and the log.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+        response : HttpResponse
+            The HTTP response.
+        route : str
+            The resolved URL name of the request.
+        duration_us : int
+            The duration of the request in microseconds.
+        """
+        get_histogram(request.method, route).record(duration_us)
+        self.add_server_timing(response, 'app', duration_us / 1000)
         # Log the duration of the request processing
-        logger.info(f'Request to {request.path} took {duration:.2f} seconds')
-        return response
\ No newline at end of file
+        self.logger.log('request_timing', path=request.path, route=route, duration_ms=duration_us / 1000)
+
+    @staticmethod
+    def add_server_timing(response, name, duration_ms):
+        """
+        Append a metric to the response's Server-Timing header.
+
+        Parameters
+        ----------
+        response : HttpResponse
+            The HTTP response.
+        name : str
+            The metric name.
+        duration_ms : float
+            The duration in milliseconds.
+        """
+        metric = f'{name};dur={duration_ms:.3f}'
+        existing = response.get('Server-Timing')
+        response['Server-Timing'] = f'{existing}, {metric}' if existing else metric
\ No newline at end of file
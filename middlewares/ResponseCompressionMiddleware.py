@@ -1,37 +1,510 @@
 import gzip
-from django.utils.deprecation import MiddlewareMixin
-from django.http import HttpResponse
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.http import FileResponse, HttpResponse
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-class ResponseCompressionMiddleware(MiddlewareMixin):
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compression functions by content coding, each taking the body and a level
+COMPRESSORS = {
+    'gzip': lambda data, level: gzip.compress(data, compresslevel=level, mtime=0),
+    'deflate': lambda data, level: zlib.compress(data, level),
+}
+if brotli is not None:
+    COMPRESSORS['br'] = lambda data, level: brotli.compress(data, quality=level)
+if zstandard is not None:
+    COMPRESSORS['zstd'] = lambda data, level: zstandard.ZstdCompressor(level=level).compress(data)
+
+# Default levels, chosen for speed on every request rather than the smallest output
+DEFAULT_LEVELS = {
+    'br': 4,
+    'zstd': 3,
+    'gzip': 6,
+    'deflate': 6,
+}
+
+# Encodings the server prefers when the client accepts several with the same quality
+DEFAULT_PREFERENCE = ('br', 'zstd', 'gzip', 'deflate')
+
+DEFAULT_MIME_TYPES = (
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/xml',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'application/xml',
+    'image/svg+xml',
+)
+
+# Leading bytes of bodies that are already compressed: gzip, zstd and zip
+COMPRESSED_MAGIC = (b'\x1f\x8b', b'\x28\xb5\x2f\xfd', b'PK\x03\x04')
+
+
+class StreamCompressor:
+    """
+    Incremental compressor with the same interface for every supported encoding.
+
+    ``compress`` returns whatever output the encoder has ready, ``flush`` forces out
+    everything buffered so far without ending the stream, and ``finish`` ends it.
+    Memory use is bounded by the encoder window, not by the size of the body.
+    """
+
+    __slots__ = ('compress', 'flush', 'finish')
+
+    def __init__(self, encoding, level):
+        """
+        Create the encoder for the given encoding.
+
+        Parameters
+        ----------
+        encoding : str
+            The content coding: 'br', 'zstd', 'gzip' or 'deflate'.
+        level : int
+            The compression level.
+        """
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=level)
+            self.compress = compressor.process
+            self.flush = compressor.flush
+            self.finish = compressor.finish
+        elif encoding == 'zstd':
+            compressor = zstandard.ZstdCompressor(level=level).compressobj()
+            self.compress = compressor.compress
+            self.flush = lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            self.finish = compressor.flush
+        else:
+            # gzip and deflate differ only in the container zlib wraps the stream in
+            wbits = 16 + zlib.MAX_WBITS if encoding == 'gzip' else zlib.MAX_WBITS
+            compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+            self.compress = compressor.compress
+            self.flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+            self.finish = compressor.flush
+
+
+def compress_stream(chunks, encoding, level, flush_chunks=True):
+    """
+    Compress an iterable of byte chunks, yielding compressed chunks as they are produced.
+
+    Parameters
+    ----------
+    chunks : iterable of bytes
+        The uncompressed body.
+    encoding : str
+        The content coding to use.
+    level : int
+        The compression level.
+    flush_chunks : bool, optional
+        Flush after every input chunk so each one reaches the client without waiting
+        for the next. Turn off for bodies that are read as fast as they can be sent.
+
+    Yields
+    ------
+    bytes
+        The compressed body.
+    """
+    compressor = StreamCompressor(encoding, level)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if flush_chunks:
+            data += compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def acompress_stream(chunks, encoding, level, flush_chunks=True):
+    """
+    Compress an async iterable of byte chunks, the async counterpart of ``compress_stream``.
+
+    Parameters
+    ----------
+    chunks : async iterable of bytes
+        The uncompressed body.
+    encoding : str
+        The content coding to use.
+    level : int
+        The compression level.
+    flush_chunks : bool, optional
+        Flush after every input chunk.
+
+    Yields
+    ------
+    bytes
+        The compressed body.
+    """
+    compressor = StreamCompressor(encoding, level)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if flush_chunks:
+            data += compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressedBodyCache:
+    """
+    Bounded LRU cache of compressed bodies, keyed by a hash of the body and the encoding.
+
+    The cache is limited both by number of entries and by the total size of the
+    compressed bytes it holds; the least recently used entries are evicted first.
+    Hits and misses are counted so the hit rate can be checked with ``stats``.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024):
+        """
+        Initialize an empty cache.
+
+        Parameters
+        ----------
+        max_entries : int, optional
+            The maximum number of cached bodies.
+        max_bytes : int, optional
+            The maximum total size of the cached compressed bodies.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(content, encoding, level):
+        """
+        Build the cache key of a body compressed with the given encoding and level.
+
+        Parameters
+        ----------
+        content : bytes
+            The uncompressed body.
+        encoding : str
+            The content coding.
+        level : int
+            The compression level.
+
+        Returns
+        -------
+        tuple
+            The cache key.
+        """
+        return hashlib.blake2b(content, digest_size=16).digest(), encoding, level
+
+    def get(self, key):
+        """
+        Get a cached compressed body and mark it as recently used.
+
+        Parameters
+        ----------
+        key : tuple
+            The key built by ``make_key``.
+
+        Returns
+        -------
+        bytes or None
+            The compressed body, or None if it is not cached.
+        """
+        with self.lock:
+            compressed = self.entries.get(key)
+            if compressed is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return compressed
+
+    def set(self, key, compressed):
+        """
+        Cache a compressed body, evicting the least recently used ones to make room.
+
+        Parameters
+        ----------
+        key : tuple
+            The key built by ``make_key``.
+        compressed : bytes
+            The compressed body.
+        """
+        # A body that could never fit would only flush the whole cache
+        if len(compressed) > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.entries[key] = compressed
+            self.size += len(compressed)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def stats(self):
+        """
+        Report the cache usage and hit rate.
+
+        Returns
+        -------
+        dict
+            The number of hits, misses, entries and cached bytes, and the hit rate.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self.entries),
+                'bytes': self.size,
+            }
+
+
+@lru_cache(maxsize=256)
+def parse_accept_encoding(header):
+    """
+    Parse an Accept-Encoding header into a mapping of coding to quality.
+
+    Browsers send only a handful of distinct headers, so results are cached.
+
+    Parameters
+    ----------
+    header : str
+        The value of the Accept-Encoding header.
+
+    Returns
+    -------
+    dict
+        Mapping of lowercased content coding to its quality value.
+    """
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+class ResponseCompressionMiddleware(AsyncMiddlewareMixin):
     """
-    Middleware to compress HTTP responses using gzip.
-    
-    This middleware compresses the content of HTTP responses with 'text/html' content type
-    using gzip to reduce the size of the response.
+    Middleware to compress HTTP responses using the best encoding the client accepts.
+
+    This middleware negotiates the encoding from the Accept-Encoding header among
+    brotli, zstd, gzip and deflate (brotli and zstd only when their libraries are
+    installed) and compresses responses whose content type is in the allowlist and
+    whose body is at least the minimum size. Streaming responses, including
+    ``FileResponse``, are compressed chunk by chunk as they are sent. Every
+    compressible response gets a ``Vary: Accept-Encoding`` header so caches keep the
+    variants apart. Partial responses (206, or any with a ``Content-Range`` header)
+    are sent as they are.
+
+    Settings
+    --------
+    COMPRESSION_MIN_SIZE : int
+        Smallest body in bytes worth compressing (default 200).
+    COMPRESSION_MIME_TYPES : iterable of str
+        Content types that are compressed.
+    COMPRESSION_LEVELS : dict
+        Compression level per encoding, merged over the defaults.
+    COMPRESSION_PREFERENCE : iterable of str
+        Server preference order among encodings with the same quality.
+    COMPRESSION_CACHE_ENTRIES : int
+        Number of compressed bodies kept in an in-process LRU cache, so identical
+        bodies are compressed once (default 0, disabled).
+    COMPRESSION_CACHE_BYTES : int
+        Total size of the compressed bodies the cache may hold (default 16 MiB).
     """
-    
+
+    def __init__(self, get_response):
+        """
+        Initialize the middleware and read the compression settings.
+
+        Parameters
+        ----------
+        get_response : callable
+            The next middleware or view in the chain.
+        """
+        super().__init__(get_response)
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 200)
+        self.mime_types = frozenset(getattr(settings, 'COMPRESSION_MIME_TYPES', DEFAULT_MIME_TYPES))
+        self.levels = {**DEFAULT_LEVELS, **getattr(settings, 'COMPRESSION_LEVELS', {})}
+        # Keep only the encodings whose library is available
+        self.preference = tuple(
+            encoding for encoding in getattr(settings, 'COMPRESSION_PREFERENCE', DEFAULT_PREFERENCE)
+            if encoding in COMPRESSORS
+        )
+        cache_entries = getattr(settings, 'COMPRESSION_CACHE_ENTRIES', 0)
+        self.body_cache = None
+        if cache_entries:
+            self.body_cache = CompressedBodyCache(
+                cache_entries, getattr(settings, 'COMPRESSION_CACHE_BYTES', 16 * 1024 * 1024),
+            )
+
+    def choose_encoding(self, header):
+        """
+        Pick the encoding to use for the given Accept-Encoding header.
+
+        Parameters
+        ----------
+        header : str
+            The value of the Accept-Encoding header.
+
+        Returns
+        -------
+        str or None
+            The chosen encoding, or None if the client accepts none of them.
+        """
+        accepted = parse_accept_encoding(header)
+        wildcard = accepted.get('*', 0.0)
+        best, best_quality = None, 0.0
+        for encoding in self.preference:
+            quality = accepted.get(encoding, wildcard)
+            # Strictly greater keeps the server preference among equal qualities
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
     def process_response(self, request, response):
         """
-        Compress the response content if the content type is 'text/html'.
-        
+        Compress the response content if its type and size make it worthwhile.
+
         Parameters
         ----------
         request : HttpRequest
             The incoming HTTP request.
         response : HttpResponse
             The HTTP response to be processed.
-        
+
         Returns
         -------
         HttpResponse
             The processed HTTP response with compressed content if applicable.
         """
-        # Check if the response content type is 'text/html'
-        if response['Content-Type'] == 'text/html':
-            # Compress the response content using gzip
-            response.content = gzip.compress(response.content)
-            # Set the 'Content-Encoding' header to 'gzip'
-            response['Content-Encoding'] = 'gzip'
-            # Update the 'Content-Length' header with the length of the compressed content
-            response['Content-Length'] = str(len(response.content))
-        return response
\ No newline at end of file
+        # Leave already encoded responses alone
+        if response.has_header('Content-Encoding'):
+            return response
+        # Compressing a partial response would break the byte ranges it describes
+        if response.status_code == 206 or response.has_header('Content-Range'):
+            return response
+        content_type = response.get('Content-Type', '').split(';', 1)[0].strip().lower()
+        if content_type not in self.mime_types:
+            return response
+        # The body depends on Accept-Encoding from here on, whatever the client sent
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if response.streaming:
+            return self.compress_streaming_response(request, response)
+        content = response.content
+        if len(content) < self.min_size or content.startswith(COMPRESSED_MAGIC):
+            return response
+        encoding = self.choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+        compressed = self.compress(content, encoding)
+        # Small or incompressible bodies can grow, send those as they are
+        if len(compressed) >= len(content):
+            return response
+        response.content = compressed
+        # Set the 'Content-Encoding' header to the chosen encoding
+        response['Content-Encoding'] = encoding
+        # Update the 'Content-Length' header with the length of the compressed content
+        response['Content-Length'] = str(len(response.content))
+        self.weaken_etag(response)
+        return response
+
+    def compress(self, content, encoding):
+        """
+        Compress a body, reusing the cached result for a body seen before.
+
+        Parameters
+        ----------
+        content : bytes
+            The uncompressed body.
+        encoding : str
+            The content coding to use.
+
+        Returns
+        -------
+        bytes
+            The compressed body.
+        """
+        level = self.levels[encoding]
+        if self.body_cache is None:
+            return COMPRESSORS[encoding](content, level)
+        key = self.body_cache.make_key(content, encoding, level)
+        compressed = self.body_cache.get(key)
+        if compressed is None:
+            compressed = COMPRESSORS[encoding](content, level)
+            self.body_cache.set(key, compressed)
+        return compressed
+
+    def compress_streaming_response(self, request, response):
+        """
+        Wrap the streaming content of a response in an incremental compressor.
+
+        The body is never held in memory: each chunk is compressed as the view yields
+        it. Chunks of a ``FileResponse`` are not flushed individually since the file
+        can be read as fast as it is sent, which gives a better ratio.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+        response : StreamingHttpResponse
+            The streaming HTTP response to be processed.
+
+        Returns
+        -------
+        StreamingHttpResponse
+            The response with compressed streaming content if applicable.
+        """
+        encoding = self.choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+        level = self.levels[encoding]
+        flush_chunks = not isinstance(response, FileResponse)
+        if getattr(response, 'is_async', False):
+            response.streaming_content = acompress_stream(response.streaming_content, encoding, level, flush_chunks)
+        else:
+            response.streaming_content = compress_stream(response.streaming_content, encoding, level, flush_chunks)
+        # The compressed length is unknown until the stream ends
+        if response.has_header('Content-Length'):
+            del response['Content-Length']
+        response['Content-Encoding'] = encoding
+        self.weaken_etag(response)
+        return response
+
+    def weaken_etag(self, response):
+        """
+        Turn a strong ETag into a weak one, since a strong ETag must change with the bytes.
+
+        Parameters
+        ----------
+        response : HttpResponse
+            The compressed HTTP response.
+        """
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
\ No newline at end of file
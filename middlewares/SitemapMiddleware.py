@@ -1,9 +1,138 @@
-from django.urls import get_resolver
-from django.http import HttpResponse
+import gzip
+import hashlib
+import re
+import threading
+import time
+from xml.sax.saxutils import escape
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.urls import NoReverseMatch, URLResolver, get_resolver, get_script_prefix, reverse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from middlewares.ResponseCompressionMiddleware import parse_accept_encoding
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-class SitemapMiddleware:
+SITEMAP_XMLNS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+# Paths served by the middleware: the sitemap or index, and the numbered children
+SITEMAP_PATH_PATTERN = re.compile(r'/sitemap(?:-(\d+))?\.xml')
+# URLs rendered per chunk of a document
+CHUNK_SIZE = 1000
+# Sites (scheme, host and script prefix) whose sitemaps are kept
+MAX_CACHED_SITES = 16
+
+
+def iter_sitemap_paths(patterns, urlconf=None, namespace=''):
+    """
+    Yield the path of every named URL pattern that takes no arguments.
+
+    Included URLconfs are walked recursively and namespaced names are reversed with
+    their namespace, so nested ``include()`` calls are covered.
+
+    Parameters
+    ----------
+    patterns : list
+        The URL patterns and resolvers to walk.
+    urlconf : str, optional
+        The URLconf the names are reversed against.
+    namespace : str, optional
+        The namespace prefix of the patterns, ending with ':'.
+
+    Yields
+    ------
+    str
+        The path of a pattern.
+    """
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            child_namespace = f'{namespace}{pattern.namespace}:' if pattern.namespace else namespace
+            yield from iter_sitemap_paths(pattern.url_patterns, urlconf, child_namespace)
+        elif pattern.name:
+            try:
+                yield reverse(f'{namespace}{pattern.name}', urlconf=urlconf)
+            except NoReverseMatch:
+                # Patterns that need arguments have no single URL to list
+                continue
+
+
+def iter_urlset_chunks(urls):
+    """
+    Render a ``urlset`` document chunk by chunk.
+
+    Parameters
+    ----------
+    urls : list of str
+        The absolute URLs of the document.
+
+    Yields
+    ------
+    bytes
+        Consecutive parts of the XML document.
+    """
+    yield f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_XMLNS}">\n'.encode()
+    for start in range(0, len(urls), CHUNK_SIZE):
+        yield ''.join(f'<url><loc>{escape(url)}</loc></url>\n' for url in urls[start:start + CHUNK_SIZE]).encode()
+    yield b'</urlset>'
+
+
+def iter_index_chunks(sitemap_urls):
+    """
+    Render a ``sitemapindex`` document listing child sitemaps.
+
+    Parameters
+    ----------
+    sitemap_urls : list of str
+        The absolute URLs of the child sitemaps.
+
+    Yields
+    ------
+    bytes
+        Consecutive parts of the XML document.
+    """
+    yield f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{SITEMAP_XMLNS}">\n'.encode()
+    yield ''.join(f'<sitemap><loc>{escape(url)}</loc></sitemap>\n' for url in sitemap_urls).encode()
+    yield b'</sitemapindex>'
+
+
+class SitemapDocument:
+    """
+    One rendered sitemap document with its ETag and precompressed gzip variant.
+    """
+
+    __slots__ = ('chunks', 'etag', 'gzipped', 'gzip_etag')
+
+    def __init__(self, chunks):
+        """
+        Store the rendered document.
+
+        Parameters
+        ----------
+        chunks : iterable of bytes
+            The parts of the XML document.
+        """
+        self.chunks = tuple(chunks)
+        content = b''.join(self.chunks)
+        digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+        self.etag = f'"{digest}"'
+        # mtime=0 keeps the compressed bytes, and so the ETag, stable across rebuilds
+        self.gzipped = gzip.compress(content, mtime=0)
+        self.gzip_etag = f'"{digest}-gzip"'
+
+
+class SitemapMiddleware(AsyncMiddlewareMixin):
     """
     Middleware to generate and serve a sitemap in XML format when a request is made to '/sitemap.xml'.
+
+    The sitemap lists every named URL pattern without arguments, including those of
+    included URLconfs. It is built once per site and rebuilt when the URLconf changes
+    or after ``SITEMAP_CACHE_TTL`` seconds (default 3600). When there are more than
+    ``SITEMAP_MAX_URLS`` URLs (default 50,000, the protocol's limit) '/sitemap.xml'
+    becomes a sitemap index of '/sitemap-1.xml', '/sitemap-2.xml' and so on.
+
+    Documents are streamed from their prebuilt chunks, answer ``If-None-Match`` with
+    304 Not Modified, and are sent precompressed to clients that accept gzip. Under
+    ASGI the sitemap is built in a worker thread, so a build does not block the event
+    loop; built documents are served directly.
     """
 
     def __init__(self, get_response):
@@ -15,11 +144,16 @@ class SitemapMiddleware:
         get_response : callable
             The next middleware or view in the chain.
         """
-        self.get_response = get_response
+        super().__init__(get_response)
+        self.ttl = getattr(settings, 'SITEMAP_CACHE_TTL', 3600)
+        self.max_urls = getattr(settings, 'SITEMAP_MAX_URLS', 50000)
+        # (scheme, host, script prefix) -> (resolver, expiry, {path: SitemapDocument})
+        self.sites = {}
+        self.lock = threading.Lock()
 
-    def __call__(self, request):
+    def process_request(self, request):
         """
-        Handle the incoming request and generate a sitemap if the request path is '/sitemap.xml'.
+        Serve the sitemap if the request path is a sitemap path.
 
         Parameters
         ----------
@@ -28,20 +162,137 @@ class SitemapMiddleware:
 
         Returns
         -------
-        HttpResponse
-            The HTTP response containing the sitemap or the response from the next middleware or view.
-        """
-        if request.path == '/sitemap.xml':
-            # Get all named URL patterns
-            urls = [url.name for url in get_resolver().url_patterns if url.name]
-            # Start the sitemap XML
-            sitemap = '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
-            # Add each URL to the sitemap
-            for url in urls:
-                sitemap += f'<url><loc>{request.build_absolute_uri(url)}</loc></url>\n'
-            # Close the sitemap XML
-            sitemap += '</urlset>'
-            # Return the sitemap as an XML response
-            return HttpResponse(sitemap, content_type='application/xml')
+        HttpResponse or None
+            The HTTP response containing the sitemap, or None to pass the request on.
+        """
+        if SITEMAP_PATH_PATTERN.fullmatch(request.path_info):
+            return self.serve(request, self.get_documents(request))
         # Pass the request to the next middleware or view
-        return self.get_response(request)
\ No newline at end of file
+        return None
+
+    async def ahandle(self, request):
+        """
+        Async counterpart of ``handle``, used when the middleware chain runs under ASGI.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        HttpResponse
+            The HTTP response containing the sitemap, or the one from the next
+            middleware or view.
+        """
+        if SITEMAP_PATH_PATTERN.fullmatch(request.path_info):
+            documents = self.get_documents(request, build=False)
+            if documents is None:
+                # Building walks the whole URLconf and reverses every URL
+                documents = await sync_to_async(self.get_documents, thread_sensitive=False)(request)
+            response = self.serve(request, documents)
+            if response is not None:
+                return response
+        return await self.get_response(request)
+
+    def get_documents(self, request, build=True):
+        """
+        Get the sitemap documents of the request's site, building them if needed.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+        build : bool, optional
+            Whether to build the documents if they are missing or out of date.
+
+        Returns
+        -------
+        dict or None
+            Mapping of path info to SitemapDocument, or None if they would have to be
+            built and ``build`` is False.
+        """
+        urlconf = getattr(request, 'urlconf', None)
+        resolver = get_resolver(urlconf)
+        key = (request.scheme, request.get_host(), get_script_prefix(), urlconf)
+        site = self.sites.get(key)
+        if site is not None and site[0] is resolver and site[1] > time.monotonic():
+            return site[2]
+        if not build:
+            return None
+        with self.lock:
+            # Another thread may have rebuilt the sitemap while this one waited
+            site = self.sites.get(key)
+            if site is not None and site[0] is resolver and site[1] > time.monotonic():
+                return site[2]
+            documents = self.build(request, resolver, urlconf)
+            if key not in self.sites and len(self.sites) >= MAX_CACHED_SITES:
+                self.sites.clear()
+            self.sites[key] = (resolver, time.monotonic() + self.ttl, documents)
+        return documents
+
+    def build(self, request, resolver, urlconf):
+        """
+        Render the sitemap, split into an index and children when it is too large.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+        resolver : URLResolver
+            The root resolver of the request's URLconf.
+        urlconf : str or None
+            The URLconf of the request.
+
+        Returns
+        -------
+        dict
+            Mapping of path info to SitemapDocument.
+        """
+        base = f'{request.scheme}://{request.get_host()}'
+        # dict.fromkeys drops duplicates while keeping the URLconf order
+        urls = [f'{base}{path}' for path in dict.fromkeys(iter_sitemap_paths(resolver.url_patterns, urlconf))]
+        if len(urls) <= self.max_urls:
+            return {'/sitemap.xml': SitemapDocument(iter_urlset_chunks(urls))}
+        documents = {}
+        sitemap_urls = []
+        for number, start in enumerate(range(0, len(urls), self.max_urls), 1):
+            documents[f'/sitemap-{number}.xml'] = SitemapDocument(iter_urlset_chunks(urls[start:start + self.max_urls]))
+            sitemap_urls.append(f'{base}{get_script_prefix()}sitemap-{number}.xml')
+        documents['/sitemap.xml'] = SitemapDocument(iter_index_chunks(sitemap_urls))
+        return documents
+
+    def serve(self, request, documents):
+        """
+        Serve a sitemap document, honouring ``If-None-Match`` and ``Accept-Encoding``.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+        documents : dict
+            The sitemap documents of the request's site, from ``get_documents``.
+
+        Returns
+        -------
+        HttpResponse or None
+            The document response, or None if no document has this path.
+        """
+        document = documents.get(request.path_info)
+        if document is None:
+            return None
+        accepted = parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        use_gzip = accepted.get('gzip', accepted.get('*', 0)) > 0
+        etag = document.gzip_etag if use_gzip else document.etag
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+            response = HttpResponseNotModified()
+        elif use_gzip:
+            response = HttpResponse(document.gzipped, content_type='application/xml')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            # Stream the prebuilt chunks rather than joining them again
+            response = StreamingHttpResponse(iter(document.chunks), content_type='application/xml')
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
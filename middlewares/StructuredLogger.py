@@ -0,0 +1,329 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import traceback
+from logging.handlers import QueueHandler
+from django.conf import settings
+
+# Name of the logger whose handlers are moved behind the queue
+QUEUED_LOGGER_NAME = 'middlewares'
+# Seconds shutdown waits for the writer thread to drain the queue
+STOP_TIMEOUT = 5
+
+_listener = None
+_listener_lock = threading.Lock()
+# Handler putting the middleware records on the queue the listener drains
+_queue_handler = None
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Formatter that renders a log record as one JSON object per line.
+
+    The structured fields passed to ``StructuredLogger.log`` are merged into the
+    object next to the timestamp, level, logger name and event name.
+    """
+
+    def format(self, record):
+        """
+        Render the record as a JSON line.
+
+        Parameters
+        ----------
+        record : LogRecord
+            The log record.
+
+        Returns
+        -------
+        str
+            The JSON object, without a trailing newline.
+        """
+        entry = {
+            'ts': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Queue handler that hands records to the writer thread without formatting them.
+
+    The stock ``QueueHandler`` formats each record on the calling thread; here all
+    formatting is left to the writer. When the queue is full the record is dropped and
+    counted instead of blocking the request.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchingQueueListener:
+    """
+    Background thread that drains the log queue and writes records in batches.
+
+    Records waiting in the queue are taken together, up to ``batch_size`` at a time.
+    Plain ``StreamHandler`` instances get the whole batch in a single write and flush;
+    other handlers, such as file and rotating file handlers, receive the records one
+    by one through ``handle()`` so their own emit logic runs. A failing handler is
+    reported through its ``handleError`` and never stops the writer thread.
+    """
+
+    def __init__(self, log_queue, handlers, batch_size=256):
+        """
+        Initialize the listener.
+
+        Parameters
+        ----------
+        log_queue : Queue
+            The queue the ``LazyQueueHandler`` puts records on.
+        handlers : list of Handler
+            The handlers the records are written to.
+        batch_size : int, optional
+            The maximum number of records written at once.
+        """
+        self.queue = log_queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.formatter = JsonLinesFormatter()
+        self.thread = threading.Thread(target=self.run, name='middleware-log-writer', daemon=True)
+
+    def start(self):
+        """
+        Start the writer thread.
+        """
+        self.thread.start()
+
+    def stop(self):
+        """
+        Write the records still queued and stop the writer thread.
+        """
+        if not self.thread.is_alive():
+            return
+        try:
+            # Never block shutdown on a full queue
+            self.queue.put(None, timeout=STOP_TIMEOUT)
+        except queue.Full:
+            return
+        self.thread.join(STOP_TIMEOUT)
+
+    def run(self):
+        """
+        Wait for records and write them in batches until stopped.
+        """
+        while True:
+            batch = [self.queue.get()]
+            # Take whatever else is already waiting, without blocking
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = None in batch
+            try:
+                self.write([record for record in batch if record is not None])
+            except Exception:
+                # Handler errors are reported by write(); anything else must not kill the thread
+                traceback.print_exc(file=sys.stderr)
+            if stopping:
+                return
+
+    def write(self, records):
+        """
+        Write a batch of records to every handler.
+
+        Parameters
+        ----------
+        records : list of LogRecord
+            The records to write.
+        """
+        if not records:
+            return
+        # Formatted lines by formatter, shared by handlers with the same formatter
+        lines = {}
+        for handler in self.handlers:
+            if type(handler) is logging.StreamHandler:
+                records_to_handle = [
+                    record for record in records if record.levelno >= handler.level and handler.filter(record)
+                ]
+                if not records_to_handle:
+                    continue
+                formatter = handler.formatter or self.formatter
+                formatted = lines.setdefault(formatter, {})
+                try:
+                    for record in records_to_handle:
+                        if id(record) not in formatted:
+                            formatted[id(record)] = formatter.format(record) + handler.terminator
+                    with handler.lock:
+                        handler.stream.write(''.join(formatted[id(record)] for record in records_to_handle))
+                        handler.flush()
+                except Exception:
+                    handler.handleError(records_to_handle[0])
+            else:
+                for record in records:
+                    if record.levelno >= handler.level:
+                        try:
+                            handler.handle(record)
+                        except Exception:
+                            handler.handleError(record)
+
+
+def get_propagated_handlers(logger):
+    """
+    Get the handlers of the ancestors a logger's records propagate to.
+
+    Parameters
+    ----------
+    logger : Logger
+        The logger.
+
+    Returns
+    -------
+    list of Handler
+        The handlers, nearest ancestor first.
+    """
+    handlers = []
+    parent = logger.parent if logger.propagate else None
+    while parent is not None:
+        handlers.extend(parent.handlers)
+        parent = parent.parent if parent.propagate else None
+    return handlers
+
+
+def start_queued_logging():
+    """
+    Move the handlers of the middleware logger behind a queue and start the writer thread.
+
+    The handlers configured for the ``middlewares`` logger in ``LOGGING`` are detached
+    and driven by the writer thread. If it has none, the handlers its records would
+    propagate to, usually those of the root logger, are driven instead and left
+    attached for other loggers; a stderr handler is used if there are none at all.
+    Handlers keep their formatters and filters; those without a formatter write JSON
+    lines. Calling this more than once has no further effect.
+
+    When the process forks, as preforking servers do after loading the application in
+    the master, the child gets a new queue and writer thread; see
+    ``restart_queued_logging_after_fork``.
+    """
+    global _listener, _queue_handler
+    with _listener_lock:
+        if _listener is not None:
+            return
+        target = logging.getLogger(QUEUED_LOGGER_NAME)
+        handlers = list(target.handlers)
+        for handler in handlers:
+            if handler.formatter is None:
+                handler.setFormatter(JsonLinesFormatter())
+            target.removeHandler(handler)
+        if not handlers:
+            handlers = get_propagated_handlers(target)
+        if not handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(JsonLinesFormatter())
+            handlers = [handler]
+        log_queue = queue.Queue(getattr(settings, 'MIDDLEWARE_LOG_QUEUE_SIZE', 10000))
+        _queue_handler = LazyQueueHandler(log_queue)
+        target.addHandler(_queue_handler)
+        target.propagate = False
+        if target.level == logging.NOTSET:
+            target.setLevel(logging.INFO)
+        _listener = BatchingQueueListener(log_queue, handlers)
+        _listener.start()
+        # Write the records still queued when the worker shuts down
+        atexit.register(stop_queued_logging)
+
+
+def stop_queued_logging():
+    """
+    Write the records still queued and stop the writer thread of this process.
+    """
+    if _listener is not None:
+        _listener.stop()
+
+
+def restart_queued_logging_after_fork():
+    """
+    Give a forked child process its own queue and writer thread.
+
+    Threads do not survive a fork, so the child inherits the listener without its
+    thread, and the queue's lock may have been held by that thread at the time of the
+    fork. Records already queued belong to the parent, which writes them.
+    """
+    global _listener, _listener_lock
+    _listener_lock = threading.Lock()
+    if _listener is None:
+        return
+    log_queue = queue.Queue(_queue_handler.queue.maxsize)
+    _queue_handler.queue = log_queue
+    _listener = BatchingQueueListener(log_queue, _listener.handlers, _listener.batch_size)
+    _listener.start()
+
+
+os.register_at_fork(after_in_child=restart_queued_logging_after_fork)
+
+
+class StructuredLogger:
+    """
+    Logger for the logging middlewares that queues structured, sampled records.
+
+    Each call records an event name and a dict of fields; nothing is formatted on the
+    request thread, and a call is skipped entirely when it is not sampled or its level
+    is disabled. The sampling rate of each middleware is read from the
+    ``MIDDLEWARE_LOG_SAMPLE_RATES`` setting, a dict of middleware class name to a
+    fraction between 0 and 1 (default 1, log everything).
+    """
+
+    def __init__(self, name, middleware_name):
+        """
+        Initialize the logger and make sure the queued writer is running.
+
+        Parameters
+        ----------
+        name : str
+            The logger name, usually the module's ``__name__``.
+        middleware_name : str
+            The middleware class name used to look up the sampling rate.
+        """
+        self.logger = logging.getLogger(name)
+        self.sample_rate = getattr(settings, 'MIDDLEWARE_LOG_SAMPLE_RATES', {}).get(middleware_name, 1.0)
+        start_queued_logging()
+
+    def log(self, event, level=logging.INFO, exc_info=None, **fields):
+        """
+        Queue a structured record, subject to sampling.
+
+        Parameters
+        ----------
+        event : str
+            The event name.
+        level : int, optional
+            The logging level.
+        exc_info : tuple or bool, optional
+            Exception information to attach, as for ``logging.Logger.log``.
+        **fields
+            The structured fields of the record.
+        """
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, event, exc_info=exc_info, extra={'fields': fields})
\ No newline at end of file
@@ -1,44 +1,49 @@
 from django.utils import timezone
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-class TimezoneMiddleware:
+class TimezoneMiddleware(AsyncMiddlewareMixin):
     """
     Middleware to set the timezone based on a cookie.
     
     This middleware sets the timezone for the current request based on the 'timezone'
     cookie. If the cookie is not present, it defaults to 'UTC'.
     """
-    
-    def __init__(self, get_response):
+
+    def process_request(self, request):
         """
-        Initialize the middleware with the given get_response callable.
-        
+        Set the timezone based on the 'timezone' cookie.
+
         Parameters
         ----------
-        get_response : callable
-            The next middleware or view in the chain.
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        None
+            The request is always passed on to the next middleware or view.
         """
-        self.get_response = get_response
+        # Get the timezone name from the 'timezone' cookie, default to 'UTC' if not present
+        timezone_name = request.COOKIES.get('timezone', 'UTC')
+        # Activate the specified timezone
+        timezone.activate(timezone_name)
+        return None
 
-    def __call__(self, request):
+    def process_response(self, request, response):
         """
-        Handle the incoming request and set the timezone based on the 'timezone' cookie.
-        
+        Deactivate the timezone after the response is generated.
+
         Parameters
         ----------
         request : HttpRequest
             The incoming HTTP request.
-        
+        response : HttpResponse
+            The HTTP response from the next middleware or view.
+
         Returns
         -------
         HttpResponse
             The HTTP response from the next middleware or view.
         """
-        # Get the timezone name from the 'timezone' cookie, default to 'UTC' if not present
-        timezone_name = request.COOKIES.get('timezone', 'UTC')
-        # Activate the specified timezone
-        timezone.activate(timezone_name)
-        # Get the response from the next middleware or view
-        response = self.get_response(request)
-        # Deactivate the timezone after the response is generated
         timezone.deactivate()
         return response
\ No newline at end of file
@@ -1,15 +1,14 @@
-import logging
+from middlewares.StructuredLogger import StructuredLogger
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-logger = logging.getLogger(__name__)
-
-class UserActivityLoggingMiddleware:
+class UserActivityLoggingMiddleware(AsyncMiddlewareMixin):
     """
     Middleware to log user activity for each HTTP request.
     
     This middleware logs the activity of authenticated users, including the username
     and the path accessed, for each HTTP request.
     """
-    
+
     def __init__(self, get_response):
         """
         Initialize the middleware with the given get_response callable.
@@ -19,9 +18,10 @@ class UserActivityLoggingMiddleware:
         get_response : callable
             The next middleware or view in the chain.
         """
-        self.get_response = get_response
+        super().__init__(get_response)
+        self.logger = StructuredLogger(__name__, 'UserActivityLoggingMiddleware')
 
-    def __call__(self, request):
+    def handle(self, request):
         """
         Handle the incoming request and log the user activity if the user is authenticated.
         
@@ -41,6 +41,27 @@ class UserActivityLoggingMiddleware:
         # Check if the user is authenticated
         if request.user.is_authenticated:
             # Log the username and the path accessed
-            logger.info(f'User {request.user.username} accessed {request.path}')
+            self.logger.log('user_activity', user=request.user.username, path=request.path)
+        
+        return response
+
+    async def ahandle(self, request):
+        """
+        Async counterpart of ``handle``, used when the middleware chain runs under ASGI.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
         
+        Returns
+        -------
+        HttpResponse
+            The HTTP response from the next middleware or view.
+        """
+        response = await self.get_response(request)
+        # Load the user without a blocking database call
+        user = await request.auser()
+        if user.is_authenticated:
+            self.logger.log('user_activity', user=user.username, path=request.path)
         return response
\ No newline at end of file
@@ -1,43 +1,41 @@
-import logging
+from middlewares.StructuredLogger import StructuredLogger
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-logger = logging.getLogger(__name__)
-
-class UserAgentLoggingMiddleware:
+class UserAgentLoggingMiddleware(AsyncMiddlewareMixin):
     """
     Middleware to log the User-Agent header for each HTTP request.
     
     This middleware logs the User-Agent header of each incoming HTTP request.
     """
-    
+
     def __init__(self, get_response):
         """
         Initialize the middleware with the given get_response callable.
-        
+
         Parameters
         ----------
         get_response : callable
             The next middleware or view in the chain.
         """
-        self.get_response = get_response
+        super().__init__(get_response)
+        self.logger = StructuredLogger(__name__, 'UserAgentLoggingMiddleware')
 
-    def __call__(self, request):
+    def process_request(self, request):
         """
-        Handle the incoming request and log the User-Agent header.
-        
+        Log the User-Agent header.
+
         Parameters
         ----------
         request : HttpRequest
             The incoming HTTP request.
-        
+
         Returns
         -------
-        HttpResponse
-            The HTTP response from the next middleware or view.
+        None
+            The request is always passed on to the next middleware or view.
         """
         # Get the User-Agent header from the request
         user_agent = request.META.get('HTTP_USER_AGENT', '')
         # Log the User-Agent header
-        logger.info(f'User Agent: {user_agent}')
-        # Get the response from the next middleware or view
-        response = self.get_response(request)
-        return response
\ No newline at end of file
+        self.logger.log('user_agent', path=request.path, user_agent=user_agent)
+        return None
\ No newline at end of file
@@ -1,46 +1,108 @@
-import logging
+from functools import lru_cache
+from typing import NamedTuple
+from django.conf import settings
 from user_agents import parse
+from middlewares.StructuredLogger import StructuredLogger
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-logger = logging.getLogger(__name__)
+# User-Agent headers longer than this are truncated before parsing and caching
+MAX_USER_AGENT_LENGTH = 512
 
-class UserDeviceLoggingMiddleware:
+
+class DeviceInfo(NamedTuple):
+    """
+    Compact record of the device information parsed from a User-Agent header.
+    """
+    browser: str
+    browser_version: str
+    os: str
+    os_version: str
+    device: str
+    is_mobile: bool
+    is_tablet: bool
+    is_pc: bool
+    is_bot: bool
+    # Human-readable summary, e.g. 'iPhone / iOS 17.1 / Mobile Safari 17.1'
+    summary: str
+
+    def __str__(self):
+        return self.summary
+
+
+def parse_device(user_agent):
+    """
+    Parse a User-Agent string into a DeviceInfo record.
+
+    Parameters
+    ----------
+    user_agent : str
+        The User-Agent header value.
+
+    Returns
+    -------
+    DeviceInfo
+        The parsed device information.
+    """
+    parsed = parse(user_agent)
+    return DeviceInfo(
+        browser=parsed.browser.family,
+        browser_version=parsed.browser.version_string,
+        os=parsed.os.family,
+        os_version=parsed.os.version_string,
+        device=parsed.device.family,
+        is_mobile=parsed.is_mobile,
+        is_tablet=parsed.is_tablet,
+        is_pc=parsed.is_pc,
+        is_bot=parsed.is_bot,
+        summary=str(parsed),
+    )
+
+
+class UserDeviceLoggingMiddleware(AsyncMiddlewareMixin):
     """
     Middleware to log user device information for analytics.
-    
+
     This middleware logs the user device information (e.g., browser, OS) from the User-Agent
-    header of each incoming HTTP request for analytics purposes.
+    header of each incoming HTTP request for analytics purposes. Parsed devices are
+    kept in an LRU cache sized by the ``USER_AGENT_CACHE_SIZE`` setting, since real
+    traffic only has a few thousand distinct User-Agent strings, and attached to the
+    request as ``request.device``. Hit and miss counters are available from
+    ``self.parse_device.cache_info()``.
     """
-    
+
     def __init__(self, get_response):
         """
         Initialize the middleware with the given get_response callable.
-        
+
         Parameters
         ----------
         get_response : callable
             The next middleware or view in the chain.
         """
-        self.get_response = get_response
+        super().__init__(get_response)
+        self.logger = StructuredLogger(__name__, 'UserDeviceLoggingMiddleware')
+        self.parse_device = lru_cache(maxsize=getattr(settings, 'USER_AGENT_CACHE_SIZE', 4096))(parse_device)
 
-    def __call__(self, request):
+    def process_request(self, request):
         """
-        Handle the incoming request and log the user device information.
-        
+        Log the user device information.
+
         Parameters
         ----------
         request : HttpRequest
             The incoming HTTP request.
-        
+
         Returns
         -------
-        HttpResponse
-            The HTTP response from the next middleware or view.
+        None
+            The request is always passed on to the next middleware or view.
         """
         # Extract the User-Agent header from the request
-        user_agent = request.META.get('HTTP_USER_AGENT', '')
-        # Parse the User-Agent string to get device information
-        user_device = parse(user_agent)
+        user_agent = request.META.get('HTTP_USER_AGENT', '')[:MAX_USER_AGENT_LENGTH]
+        # Parse the User-Agent string to get device information, cached per string
+        user_device = self.parse_device(user_agent)
+        # Make the device information available to views
+        request.device = user_device
         # Log the device information
-        logger.info(f'User device: {user_device}')
-        # Get the response from the next middleware or view
-        return self.get_response(request)
\ No newline at end of file
+        self.logger.log('user_device', path=request.path, device=user_device.summary)
+        return None
\ No newline at end of file
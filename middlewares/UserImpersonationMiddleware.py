@@ -1,26 +1,16 @@
 from django.contrib.auth.models import User
-from django.shortcuts import get_object_or_404
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-class UserImpersonationMiddleware:
+class UserImpersonationMiddleware(AsyncMiddlewareMixin):
     """
     Middleware to allow user impersonation based on a cookie.
     
     This middleware allows an admin to impersonate another user by setting a cookie
     with the user's ID. The request's user object is replaced with the impersonated user.
     """
-    
-    def __init__(self, get_response):
-        """
-        Initialize the middleware with the given get_response callable.
-        
-        Parameters
-        ----------
-        get_response : callable
-            The next middleware or view in the chain.
-        """
-        self.get_response = get_response
 
-    def __call__(self, request):
+    def handle(self, request):
         """
         Handle the incoming request and replace the user object if impersonation is enabled.
         
@@ -41,4 +31,30 @@ class UserImpersonationMiddleware:
             request.user = get_object_or_404(User, id=impersonate_user_id)
         # Get the response from the next middleware or view
         response = self.get_response(request)
-        return response
\ No newline at end of file
+        return response
+
+    async def ahandle(self, request):
+        """
+        Async counterpart of ``handle``, used when the middleware chain runs under ASGI.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+        
+        Returns
+        -------
+        HttpResponse
+            The HTTP response from the next middleware or view.
+        """
+        impersonate_user_id = request.COOKIES.get('impersonate_user_id')
+        if impersonate_user_id:
+            # Load the impersonated user with the async ORM
+            user = await aget_object_or_404(User, id=impersonate_user_id)
+            request.user = user
+
+            async def auser():
+                return user
+
+            request.auser = auser
+        return await self.get_response(request)
\ No newline at end of file
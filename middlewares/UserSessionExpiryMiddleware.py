@@ -1,15 +1,16 @@
 from django.utils import timezone
-from django.contrib.auth import logout
+from django.contrib.auth import alogout, logout
 from django.conf import settings
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-class UserSessionExpiryMiddleware:
+class UserSessionExpiryMiddleware(AsyncMiddlewareMixin):
     """
     Middleware to handle user session expiry based on inactivity.
     
     This middleware logs out users if they have been inactive for a period longer
     than the session timeout defined in the settings.
     """
-    
+
     def __init__(self, get_response):
         """
         Initialize the middleware with the given get_response callable and session timeout.
@@ -19,10 +20,10 @@ class UserSessionExpiryMiddleware:
         get_response : callable
             The next middleware or view in the chain.
         """
-        self.get_response = get_response
+        super().__init__(get_response)
         self.session_timeout = settings.SESSION_COOKIE_AGE  # in seconds
 
-    def __call__(self, request):
+    def handle(self, request):
         """
         Handle the incoming request and log out the user if the session has expired.
         
@@ -48,4 +49,26 @@ class UserSessionExpiryMiddleware:
             request.session['last_activity'] = timezone.now()
         # Get the response from the next middleware or view
         response = self.get_response(request)
-        return response
\ No newline at end of file
+        return response
+
+    async def ahandle(self, request):
+        """
+        Async counterpart of ``handle``, used when the middleware chain runs under ASGI.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+        
+        Returns
+        -------
+        HttpResponse
+            The HTTP response from the next middleware or view.
+        """
+        user = await request.auser()
+        if user.is_authenticated:
+            last_activity = await request.session.aget('last_activity')
+            if last_activity and (timezone.now() - last_activity).total_seconds() > self.session_timeout:
+                await alogout(request)
+            await request.session.aset('last_activity', timezone.now())
+        return await self.get_response(request)
\ No newline at end of file
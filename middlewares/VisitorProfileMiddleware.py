@@ -1,44 +1,625 @@
+import atexit
+import hashlib
+import logging
+import math
+import os
+import threading
+import weakref
+from datetime import timedelta
+from django.conf import settings
 from django.core.cache import cache
+from django.utils import timezone
+from middlewares.RateLimitMiddleware import get_redis_client
+from middlewares.StructuredLogger import StructuredLogger
+from middlewares.AsyncMiddlewareMixin import AsyncMiddlewareMixin
 
-class VisitorProfileMiddleware:
+# strftime formats of the time buckets unique visitors are counted in
+BUCKET_FORMATS = {
+    'hour': '%Y%m%d%H',
+    'day': '%Y%m%d',
+}
+
+# Live buffers, whose flush threads are restarted in forked child processes
+_buffers = weakref.WeakSet()
+
+
+class HyperLogLog:
+    """
+    Fixed-size HyperLogLog sketch estimating the number of distinct values added to it.
+
+    The sketch holds ``2 ** precision`` one-byte registers, so its size does not depend
+    on how many values are added. The standard error is about ``1.04 / sqrt(2 ** precision)``,
+    roughly 1.6% at the default precision of 12 (a 4 KiB sketch). Sketches with the same
+    precision can be merged, which gives the estimate for the union of their values.
+    """
+
+    __slots__ = ('precision', 'registers')
+
+    def __init__(self, precision=12, registers=None):
+        """
+        Initialize an empty sketch, or one with the given registers.
+
+        Parameters
+        ----------
+        precision : int, optional
+            Number of hash bits used to pick a register, between 4 and 16.
+        registers : bytes, optional
+            Existing register values, as produced by ``to_bytes``.
+        """
+        self.precision = precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(1 << precision)
+
+    @staticmethod
+    def hash(value):
+        """
+        Hash a value to the 64-bit integer the sketch is updated with.
+
+        Parameters
+        ----------
+        value : str
+            The value to hash.
+
+        Returns
+        -------
+        int
+            The 64-bit hash of the value.
+        """
+        return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+    def add_hash(self, hashed):
+        """
+        Add a value that was already hashed with ``hash``.
+
+        Parameters
+        ----------
+        hashed : int
+            The 64-bit hash of the value.
+
+        Returns
+        -------
+        bool
+            True if the sketch changed.
+        """
+        remaining_bits = 64 - self.precision
+        # The top bits pick the register, the rest give the rank of the first set bit
+        index = hashed >> remaining_bits
+        rank = remaining_bits - (hashed & ((1 << remaining_bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def add(self, value):
+        """
+        Add a value to the sketch.
+
+        Parameters
+        ----------
+        value : str
+            The value to add.
+        """
+        self.add_hash(self.hash(value))
+
+    def merge(self, other):
+        """
+        Merge another sketch into this one.
+
+        Parameters
+        ----------
+        other : HyperLogLog
+            The sketch to merge, with the same precision.
+        """
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge HyperLogLog sketches with different precisions')
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        """
+        Estimate the number of distinct values added to the sketch.
+
+        Returns
+        -------
+        int
+            The estimated number of distinct values.
+        """
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        # Linear counting is more accurate while many registers are still empty
+        if estimate <= 2.5 * size and zeros:
+            estimate = size * math.log(size / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        """
+        Serialize the sketch to a compact blob: one precision byte followed by the registers.
+
+        Returns
+        -------
+        bytes
+            The serialized sketch.
+        """
+        return bytes([self.precision]) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Load a sketch serialized with ``to_bytes``.
+
+        Parameters
+        ----------
+        data : bytes
+            The serialized sketch.
+
+        Returns
+        -------
+        HyperLogLog
+            The loaded sketch.
+        """
+        return cls(data[0], data[1:])
+
+
+def get_unique_visitors(path, start, end=None, granularity='day', cache_backend=cache):
+    """
+    Estimate the number of unique visitors to a path over a range of time buckets.
+
+    The sketches of every bucket between ``start`` and ``end`` are merged, so a visitor
+    seen in several buckets is only counted once.
+
+    Parameters
+    ----------
+    path : str
+        The URL path.
+    start : datetime
+        A time inside the first bucket.
+    end : datetime, optional
+        A time inside the last bucket, defaults to ``start``.
+    granularity : str, optional
+        The bucket size, 'hour' or 'day'.
+    cache_backend : BaseCache, optional
+        The Django cache backend the sketches are stored in.
+
+    Returns
+    -------
+    int
+        The estimated number of unique visitors.
+    """
+    bucket_format = BUCKET_FORMATS[granularity]
+    step = timedelta(hours=1) if granularity == 'hour' else timedelta(days=1)
+    # Bucket names are fixed-width digits, so they compare in time order
+    last_bucket = (end or start).strftime(bucket_format)
+    keys = []
+    while start.strftime(bucket_format) <= last_bucket:
+        keys.append(f'unique_visitors_{granularity}_{path}_{start.strftime(bucket_format)}')
+        start += step
+    sketch = None
+    for blob in cache_backend.get_many(keys).values():
+        if sketch is None:
+            sketch = HyperLogLog.from_bytes(blob)
+        else:
+            sketch.merge(HyperLogLog.from_bytes(blob))
+    return sketch.count() if sketch is not None else 0
+
+
+class VisitCounterBuffer:
+    """
+    In-process buffer of visit counts that is flushed to the cache in batches.
+
+    Requests only increment a local counter. A background thread pushes the buffered
+    counts to the cache every ``flush_interval`` seconds, or as soon as ``max_keys``
+    distinct paths are buffered, and once more when the worker exits. A batch that
+    fails to flush is merged back and retried with the next one. While the cache is
+    unavailable the buffer holds at most ``2 * max_keys`` keys; visits to further
+    paths are dropped and counted in ``dropped``. A process forked after the buffer
+    was created, such as a preforked server worker, starts with an empty buffer and
+    its own flush thread.
+    """
+
+    def __init__(self, cache_backend=cache, flush_interval=5, max_keys=1000):
+        """
+        Initialize the buffer and start the background flush thread.
+
+        Parameters
+        ----------
+        cache_backend : BaseCache, optional
+            The Django cache backend the counts are flushed to.
+        flush_interval : float, optional
+            Seconds between two flushes.
+        max_keys : int, optional
+            Number of distinct buffered keys that triggers an early flush.
+        """
+        self.cache = cache_backend
+        self.flush_interval = flush_interval
+        self.max_keys = max_keys
+        # Paths are client controlled, so the number of buffered keys is capped
+        self.key_limit = 2 * max_keys
+        self.logger = StructuredLogger(__name__, 'VisitorProfileMiddleware')
+        self.start()
+        _buffers.add(self)
+        # Flush whatever is left when the worker shuts down
+        atexit.register(self.flush)
+
+    def start(self):
+        """
+        Reset the buffer and start the background flush thread of this process.
+
+        This also runs in a forked child, which inherits neither the thread nor a
+        usable lock; the counts it inherits are flushed by the parent.
+        """
+        self.counts = {}
+        self.dropped = 0
+        self.lock = threading.Lock()
+        # Set to wake the flush thread before the interval is over
+        self.flush_requested = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='visit-counter-flush', daemon=True)
+        self.thread.start()
+
+    def add(self, key):
+        """
+        Count one visit for the given cache key without touching the cache.
+
+        Parameters
+        ----------
+        key : str
+            The cache key of the counter.
+        """
+        with self.lock:
+            count = self.counts.get(key)
+            if count is not None:
+                self.counts[key] = count + 1
+            elif len(self.counts) < self.key_limit:
+                self.counts[key] = 1
+            else:
+                self.dropped += 1
+            full = len(self.counts) >= self.max_keys
+        if full:
+            self.flush_requested.set()
+
+    def run(self):
+        """
+        Flush the buffer on every interval or when it fills up.
+        """
+        while True:
+            self.flush_requested.wait(self.flush_interval)
+            self.flush_requested.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # Keep the thread alive, the batch was merged back for the next flush
+                self.logger.log(
+                    'visit_flush_failed', level=logging.ERROR, error=str(e),
+                    buffered=len(self.counts), dropped=self.dropped,
+                )
+
+    def restore(self, counts):
+        """
+        Merge counts that failed to flush back into the buffer.
+
+        Parameters
+        ----------
+        counts : dict
+            The counts that were not written, by key.
+        """
+        with self.lock:
+            for key, count in counts.items():
+                if key in self.counts:
+                    self.counts[key] += count
+                elif len(self.counts) < self.key_limit:
+                    self.counts[key] = count
+                else:
+                    self.dropped += count
+
+    def flush(self):
+        """
+        Add the buffered counts to the cached counters in one batch.
+
+        Raises
+        ------
+        Exception
+            Any error of the cache, after the unwritten counts were merged back.
+        """
+        # Swap the buffer out so requests can keep counting while the batch is written
+        with self.lock:
+            counts, self.counts = self.counts, {}
+        if not counts:
+            return
+        try:
+            self.write(counts)
+        except Exception:
+            self.restore(counts)
+            raise
+
+    def write(self, counts):
+        """
+        Write a batch of counts to the cache, removing each key once it is written.
+
+        Parameters
+        ----------
+        counts : dict
+            The counts to add, by key.
+        """
+        redis_client = get_redis_client(self.cache)
+        if redis_client is not None:
+            # Send every increment in a single pipelined round trip
+            pipeline = redis_client.pipeline(transaction=False)
+            for key, count in counts.items():
+                pipeline.incrby(self.cache.make_key(key), count)
+            pipeline.execute()
+            counts.clear()
+            return
+        for key, count in list(counts.items()):
+            try:
+                self.cache.incr(key, count)
+            except ValueError:
+                # Create the counter, unless another worker just did
+                if not self.cache.add(key, count, timeout=None):
+                    self.cache.incr(key, count)
+            del counts[key]
+
+
+def restart_buffers_after_fork():
+    """
+    Start the flush threads of the buffers in a forked child process.
+    """
+    for buffer in list(_buffers):
+        buffer.start()
+
+
+os.register_at_fork(after_in_child=restart_buffers_after_fork)
+
+
+class UniqueVisitorBuffer(VisitCounterBuffer):
+    """
+    In-process HyperLogLog sketches of the visitors to each path, per hour and per day.
+
+    Requests only update the local sketches. On every flush the sketches that changed
+    since the previous one are merged into the cached sketches, with one ``get_many``
+    and at most one ``set_many`` per bucket size. Sketches written by a flush are read
+    again by the next one, and written again if a concurrent read-merge-write from
+    another worker overwrote them; unchanged sketches whose cached copy already holds
+    their registers are not written at all.
+
+    Local sketches are kept until their bucket is over, or until the buffer holds
+    ``max_keys`` of them. A sketch is then written one last time without that check, so
+    if another worker's merge overwrites that write, the registers only this worker
+    had raised since its previous flush are lost: the bucket undercounts by at most
+    the visitors this worker recorded for it within one flush interval.
+    """
+
+    # How long the cached sketches of each bucket size are kept, in seconds
+    timeouts = {
+        'hour': 60 * 60 * 48,
+        'day': 60 * 60 * 24 * 90,
+    }
+
+    def __init__(self, cache_backend=cache, flush_interval=5, max_keys=1000, precision=12):
+        """
+        Initialize the buffer and start the background flush thread.
+
+        Parameters
+        ----------
+        cache_backend : BaseCache, optional
+            The Django cache backend the sketches are merged into.
+        flush_interval : float, optional
+            Seconds between two flushes.
+        max_keys : int, optional
+            Number of local sketches that triggers an early flush.
+        precision : int, optional
+            Precision of the HyperLogLog sketches.
+        """
+        self.precision = precision
+        super().__init__(cache_backend, flush_interval, max_keys)
+
+    def start(self):
+        """
+        Reset the buffer and start the background flush thread of this process.
+        """
+        # Keys of the sketches changed since the previous flush, and of those it wrote
+        self.changed = set()
+        self.unverified = set()
+        super().start()
+
+    def add(self, path, visitor_id):
+        """
+        Record a visit to the given path in the sketches of the current hour and day.
+
+        Parameters
+        ----------
+        path : str
+            The URL path.
+        visitor_id : str
+            A stable identifier of the visitor.
+        """
+        now = timezone.now()
+        # Hash once and reuse the hash for both bucket sizes
+        hashed = HyperLogLog.hash(visitor_id)
+        with self.lock:
+            for granularity, bucket_format in BUCKET_FORMATS.items():
+                key = (granularity, f'unique_visitors_{granularity}_{path}_{now.strftime(bucket_format)}')
+                sketch = self.counts.get(key)
+                if sketch is None:
+                    if len(self.counts) >= self.key_limit:
+                        self.dropped += 1
+                        continue
+                    sketch = self.counts[key] = HyperLogLog(self.precision)
+                if sketch.add_hash(hashed):
+                    self.changed.add(key)
+            full = len(self.counts) >= self.max_keys
+        if full:
+            self.flush_requested.set()
+
+    def restore(self, sketches):
+        """
+        Merge sketches that failed to flush back into the buffer.
+
+        Merging is idempotent, so sketches that were partly written are simply
+        written again with the next flush.
+
+        Parameters
+        ----------
+        sketches : dict
+            The sketches removed from the buffer, by (granularity, cache key).
+        """
+        with self.lock:
+            self.changed.update(sketches)
+            for key, sketch in sketches.items():
+                existing = self.counts.get(key)
+                if existing is not None:
+                    existing.merge(sketch)
+                elif len(self.counts) < self.key_limit:
+                    self.counts[key] = sketch
+                else:
+                    self.dropped += 1
+
+    def flush(self):
+        """
+        Merge the changed and the last written local sketches into the cached sketches.
+
+        Raises
+        ------
+        Exception
+            Any error of the cache, after the removed sketches were merged back and
+            the others marked as changed again.
+        """
+        now = timezone.now()
+        current = {granularity: now.strftime(bucket_format) for granularity, bucket_format in BUCKET_FORMATS.items()}
+        blobs = {granularity: {} for granularity in BUCKET_FORMATS}
+        removed = {}
+        with self.lock:
+            pending = self.changed | self.unverified
+            self.changed = set()
+            full = len(self.counts) >= self.max_keys
+            for (granularity, key), sketch in list(self.counts.items()):
+                if (granularity, key) in pending:
+                    blobs[granularity][key] = sketch.to_bytes()
+                # Forget sketches of buckets that are over, or all of them if the buffer is full
+                if full or not key.endswith(current[granularity]):
+                    removed[(granularity, key)] = self.counts.pop((granularity, key))
+        try:
+            written = self.write(blobs)
+        except Exception:
+            with self.lock:
+                self.changed.update(key for key in pending if key in self.counts)
+            self.restore(removed)
+            raise
+        with self.lock:
+            self.unverified = {key for key in written if key in self.counts}
+
+    def write(self, blobs):
+        """
+        Merge serialized local sketches into the cached sketches.
+
+        Parameters
+        ----------
+        blobs : dict
+            Serialized sketches by cache key, per granularity.
+
+        Returns
+        -------
+        set
+            The (granularity, cache key) pairs of the sketches written.
+        """
+        written = set()
+        for granularity, local in blobs.items():
+            if not local:
+                continue
+            cached = self.cache.get_many(list(local))
+            merged = {}
+            for key, blob in local.items():
+                if key in cached:
+                    sketch = HyperLogLog.from_bytes(cached[key])
+                    sketch.merge(HyperLogLog.from_bytes(blob))
+                    blob = sketch.to_bytes()
+                    # The cached sketch already holds every local register
+                    if blob == cached[key]:
+                        continue
+                merged[key] = blob
+            if merged:
+                self.cache.set_many(merged, timeout=self.timeouts[granularity])
+                written.update((granularity, key) for key in merged)
+        return written
+
+
+class VisitorProfileMiddleware(AsyncMiddlewareMixin):
     """
     Middleware to track the number of visits to each URL path.
-    
+
     This middleware uses Django's caching framework to count the number of visits
-    to each URL path and store the count in the cache.
+    to each URL path and store the count in the cache. Counts are buffered in-process
+    and flushed in batches, so requests never wait on the cache. The flush interval
+    and buffer size are read from the ``VISITOR_PROFILE_FLUSH_INTERVAL`` (seconds) and
+    ``VISITOR_PROFILE_BUFFER_SIZE`` (distinct paths) settings.
+
+    Unique visitors per path are estimated with HyperLogLog sketches per hour and per
+    day, readable with ``get_unique_visitors``. Set ``VISITOR_PROFILE_UNIQUE_VISITORS``
+    to False to turn this off, and ``VISITOR_PROFILE_HLL_PRECISION`` to trade sketch
+    size for accuracy.
     """
-    
+
     def __init__(self, get_response):
         """
         Initialize the middleware with the given get_response callable.
-        
+
         Parameters
         ----------
         get_response : callable
             The next middleware or view in the chain.
         """
-        self.get_response = get_response
+        super().__init__(get_response)
+        self.buffer = VisitCounterBuffer(
+            flush_interval=getattr(settings, 'VISITOR_PROFILE_FLUSH_INTERVAL', 5),
+            max_keys=getattr(settings, 'VISITOR_PROFILE_BUFFER_SIZE', 1000),
+        )
+        self.unique_visitors = None
+        if getattr(settings, 'VISITOR_PROFILE_UNIQUE_VISITORS', True):
+            self.unique_visitors = UniqueVisitorBuffer(
+                flush_interval=getattr(settings, 'VISITOR_PROFILE_FLUSH_INTERVAL', 5),
+                max_keys=getattr(settings, 'VISITOR_PROFILE_BUFFER_SIZE', 1000),
+                precision=getattr(settings, 'VISITOR_PROFILE_HLL_PRECISION', 12),
+            )
+
+    def get_visitor_id(self, request):
+        """
+        Get a stable identifier for the visitor making the request.
+
+        Only the request headers are used, so the session and user are never loaded
+        for counting.
+
+        Parameters
+        ----------
+        request : HttpRequest
+            The incoming HTTP request.
+
+        Returns
+        -------
+        str
+            The session cookie, falling back to the IP address and User-Agent.
+        """
+        session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if session_key:
+            return f'session_{session_key}'
+        return f"ip_{request.META.get('REMOTE_ADDR')}_{request.META.get('HTTP_USER_AGENT', '')}"
 
-    def __call__(self, request):
+    def process_request(self, request):
         """
-        Handle the incoming request and update the visit count for the URL path.
-        
+        Update the visit count for the URL path.
+
         Parameters
         ----------
         request : HttpRequest
             The incoming HTTP request.
-        
+
         Returns
         -------
-        HttpResponse
-            The HTTP response from the next middleware or view.
+        None
+            The request is always passed on to the next middleware or view.
         """
         # Generate a cache key based on the request path
         cache_key = f'visits_{request.path}'
-        # Get the current visit count from the cache, default to 0 if not present
-        visits = cache.get(cache_key, 0)
-        # Increment the visit count and store it back in the cache
-        cache.set(cache_key, visits + 1, timeout=None)
-        # Get the response from the next middleware or view
-        response = self.get_response(request)
-        return response
\ No newline at end of file
+        # Count the visit locally, it reaches the cache with the next flush
+        self.buffer.add(cache_key)
+        if self.unique_visitors is not None:
+            # Record the visitor in the local unique visitor sketches
+            self.unique_visitors.add(request.path, self.get_visitor_id(request))
+        return None
\ No newline at end of file
@@ -0,0 +1,44 @@
+import unittest
+from unittest import mock
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure()
+
+from django.core.handlers.base import BaseHandler
+from django.test import RequestFactory, override_settings
+from django.urls import path
+
+MIDDLEWARE = 'middlewares.ExceptionLoggingMiddleware.ExceptionLoggingMiddleware'
+
+
+def failing_view(request):
+    raise KeyError(request.GET.get('id'))
+
+
+urlpatterns = [path('fail/', failing_view)]
+
+
+class ProcessExceptionTests(unittest.TestCase):
+    """
+    Exceptions raised by views reach the middleware, and repeats are only counted.
+    """
+
+    def test_repeated_exception_is_logged_once_and_counted(self):
+        with override_settings(ROOT_URLCONF=__name__, MIDDLEWARE=[MIDDLEWARE]):
+            handler = BaseHandler()
+            handler.load_middleware()
+            middleware = handler._exception_middleware[0].__self__
+            with mock.patch.object(middleware.logger, 'log') as log, \
+                    mock.patch('django.core.handlers.base.log_response'):
+                for request_id in range(3):
+                    response = handler.get_response(RequestFactory().get('/fail/', {'id': request_id}))
+                    self.assertEqual(response.status_code, 500)
+        self.assertEqual(log.call_count, 1)
+        self.assertEqual(log.call_args.args[0], 'unhandled_exception')
+        (count,) = [entry[2] for entry in middleware.exceptions.entries.values()]
+        self.assertEqual(count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
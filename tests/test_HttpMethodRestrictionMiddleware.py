@@ -0,0 +1,48 @@
+import unittest
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure()
+
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from middlewares.HttpMethodRestrictionMiddleware import HttpMethodRestrictionMiddleware
+
+
+def view(request):
+    return HttpResponse('ok')
+
+
+class NestedPrefixTests(unittest.TestCase):
+    """
+    Rules of nested prefixes all apply, so a nested rule cannot loosen its parent.
+    """
+
+    def get_response(self, restrictions, method, path):
+        with override_settings(HTTP_METHOD_RESTRICTIONS=restrictions):
+            middleware = HttpMethodRestrictionMiddleware(view)
+        return middleware(RequestFactory().generic(method, path))
+
+    def test_nested_rule_keeps_parent_restriction(self):
+        restrictions = {'/admin/': ['DELETE'], '/admin/x/': ['POST']}
+        response = self.get_response(restrictions, 'DELETE', '/admin/x/y')
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response['Allow'], 'GET, HEAD, OPTIONS, PATCH, PUT')
+        self.assertEqual(self.get_response(restrictions, 'POST', '/admin/x/y').status_code, 405)
+        self.assertEqual(self.get_response(restrictions, 'POST', '/admin/y').status_code, 200)
+        self.assertEqual(self.get_response(restrictions, 'GET', '/admin/x/y').status_code, 200)
+
+    def test_nested_allow_list_intersects_parent(self):
+        restrictions = {'/api/': {'allow': ['GET', 'POST']}, '/api/read/': {'allow': ['GET', 'PUT']}}
+        response = self.get_response(restrictions, 'PUT', '/api/read/1')
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response['Allow'], 'GET')
+        self.assertEqual(self.get_response(restrictions, 'GET', '/api/read/1').status_code, 200)
+
+    def test_non_standard_method_passes_deny_rule(self):
+        restrictions = {'/dav/': ['DELETE']}
+        self.assertEqual(self.get_response(restrictions, 'PROPFIND', '/dav/file').status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
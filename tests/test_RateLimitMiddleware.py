@@ -0,0 +1,41 @@
+import asyncio
+import unittest
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure()
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from middlewares.RateLimitMiddleware import FixedWindowLimiter, SlidingWindowLogLimiter, TokenBucketLimiter
+
+
+class AsyncHitTests(unittest.TestCase):
+    """
+    Concurrent async hits are counted atomically, as sync ones are.
+    """
+
+    def test_concurrent_ahit_allows_exactly_rate(self):
+        limiter = FixedWindowLimiter(10, 60, LocMemCache('rate-limit-tests', {}))
+
+        async def run():
+            return await asyncio.gather(*(limiter.ahit('client') for _ in range(50)))
+
+        results = asyncio.run(run())
+        self.assertEqual(sum(results), 10)
+
+
+class RedisOnlyLimiterTests(unittest.TestCase):
+    """
+    Limiters without an atomic generic cache implementation refuse other backends.
+    """
+
+    def test_sliding_window_and_token_bucket_require_redis(self):
+        for engine in (SlidingWindowLogLimiter, TokenBucketLimiter):
+            with self.subTest(engine=engine.__name__):
+                with self.assertRaises(ImproperlyConfigured):
+                    engine(10, 60, LocMemCache('rate-limit-tests', {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
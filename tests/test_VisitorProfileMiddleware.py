@@ -0,0 +1,64 @@
+import unittest
+from unittest import mock
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure()
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+from middlewares.VisitorProfileMiddleware import UniqueVisitorBuffer, get_unique_visitors
+
+
+class UniqueVisitorFlushTests(unittest.TestCase):
+    """
+    Buffers of several workers flushing the same key converge on the union of their visitors.
+    """
+
+    def setUp(self):
+        self.cache = LocMemCache('unique-visitor-tests', {})
+        self.cache.clear()
+        # Flushed explicitly, the flush threads never wake up during a test
+        self.first = UniqueVisitorBuffer(self.cache, flush_interval=3600)
+        self.second = UniqueVisitorBuffer(self.cache, flush_interval=3600)
+
+    def add_visitors(self, buffer, visitors):
+        for visitor in visitors:
+            buffer.add('/page/', visitor)
+
+    def count(self):
+        return get_unique_visitors('/page/', timezone.now(), cache_backend=self.cache)
+
+    def test_two_buffers_merge_into_the_same_key(self):
+        self.add_visitors(self.first, (f'a{i}' for i in range(200)))
+        self.add_visitors(self.second, (f'b{i}' for i in range(200)))
+        self.first.flush()
+        self.second.flush()
+        self.assertAlmostEqual(self.count(), 400, delta=20)
+
+    def test_lost_merge_is_repaired_by_the_next_flush(self):
+        self.add_visitors(self.first, (f'a{i}' for i in range(200)))
+        self.add_visitors(self.second, (f'b{i}' for i in range(200)))
+        self.first.flush()
+        # The second buffer read the cache before the first one wrote, so its
+        # read-merge-write replaces the first buffer's sketches
+        for (granularity, key), sketch in self.second.counts.items():
+            self.cache.set(key, sketch.to_bytes())
+        self.assertAlmostEqual(self.count(), 200, delta=10)
+        self.first.flush()
+        self.assertAlmostEqual(self.count(), 400, delta=20)
+
+    def test_unchanged_sketches_are_not_written_again(self):
+        self.add_visitors(self.first, (f'a{i}' for i in range(200)))
+        self.first.flush()
+        # The next flush only reads the sketches back to check them
+        self.first.flush()
+        with mock.patch.object(self.cache, 'get_many') as get_many, \
+                mock.patch.object(self.cache, 'set_many') as set_many:
+            self.first.flush()
+        get_many.assert_not_called()
+        set_many.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()